@@ -1,12 +1,49 @@
 # routes.py
-from flask import Blueprint, jsonify, request, current_app, abort
+import re
+from functools import lru_cache
+import orjson
+from flask import Blueprint, Response, request, current_app, abort
 from tools.auth import require_token  # new decorator below
 
 bp = Blueprint("api", __name__)
 
+# seconds between SSE keep-alive pings on /stream
+HEARTBEAT_INTERVAL = 15
+# soft cap on bytes of queued events coalesced into one /stream write
+SSE_BATCH_BYTES = 8192
+
+@lru_cache(maxsize=64)
+def _sse_prefix(event: str | None) -> bytes:
+    """The optional "event:" line plus the "data:" prefix for an SSE frame."""
+    if event:
+        return b"event: " + event.encode("utf-8") + b"\ndata: "
+    return b"data: "
+
+def _sse(data: dict, event: str | None = None) -> bytes:
+    """Encode one SSE frame; the blank line terminates it."""
+    return _sse_prefix(event) + orjson.dumps(data) + b"\n\n"
+
+# fixed frames: only the integer / session id is formatted in
+_PING_FMT = b'event: ping\ndata: {"ts":%d}\n\n'
+_HELLO_FMT = b'event: hello\ndata: {"ok":true,"session":"%s"}\n\n'
+# ids that need no JSON escaping inside _HELLO_FMT
+_PLAIN_SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def _hello_frame(session_id: str) -> bytes:
+    if _PLAIN_SESSION_ID.fullmatch(session_id):
+        return _HELLO_FMT % session_id.encode("ascii")
+    return _sse({"ok": True, "session": session_id}, event="hello")
+
+_HEALTH_BODY = b'{"status":"ok"}'
+_TOO_MANY_STREAMS_BODY = b'{"error":"too_many_streams"}'
+
+def _json_response(body: bytes) -> Response:
+    """Wrap an already-encoded JSON body, bypassing Flask's JSON provider"""
+    return Response(body, mimetype="application/json")
+
 @bp.get("/health")
 def health():
-    return jsonify(status="ok"), 200
+    return _json_response(_HEALTH_BODY), 200
 
 @bp.post("/chat")
 # @require_token(optional=False)  # Disabled for demo - add back for production
@@ -14,7 +51,7 @@ def chat():
     data = request.get_json(force=True, silent=True) or {}
     # call into mcp_server.py
     resp = current_app.mcp.handle_chat(data)
-    return jsonify(resp), 200
+    return _json_response(orjson.dumps(resp)), 200
 
 @bp.get("/")
 def root():
@@ -23,41 +60,57 @@ def root():
 
 @bp.get("/mcp/info")
 def mcp_info():
-    return jsonify(current_app.mcp.get_info()), 200
+    return _json_response(current_app.mcp.get_info_bytes()), 200
+
+@bp.post("/mcp/list_tools")
+def mcp_list_tools():
+    # the tool schemas never change, so the encoded body is built once
+    return _json_response(current_app.mcp.list_tools_bytes()), 200
 
 @bp.get("/stream")
 # @require_token(optional=False)  # Disabled for demo - add back for production
 def stream():
     from flask import Response, stream_with_context, request, current_app
-    import json, time
+    import time, queue
 
     session_id = request.args.get("session_id") or "default"
-    q = current_app.event_bus.get(session_id)
-
-    def _sse(data: dict, event: str | None = None):
-        # format: optional "event:" then "data:"; blank line to end
-        lines = []
-        if event: lines.append(f"event: {event}")
-        lines.append("data: " + json.dumps(data, ensure_ascii=False))
-        lines.append("")  # terminator
-        return "\n".join(lines) + "\n"
+    bus = current_app.event_bus
+    q = bus.subscribe(session_id)
+    if q is None:
+        return _json_response(_TOO_MANY_STREAMS_BODY), 429
 
     @stream_with_context
     def generate():
         # initial hello
-        yield _sse({"ok": True, "session": session_id}, event="hello")
-        last_beat = time.time()
+        yield _hello_frame(session_id)
+        next_beat = time.monotonic() + HEARTBEAT_INTERVAL
         try:
             while True:
-                try:
-                    item = q.get(timeout=10)
-                    yield _sse(item, event=item.get("type"))
-                except Exception:
-                    # heartbeat every 15s to keep proxies alive
-                    now = time.time()
-                    if now - last_beat >= 15:
-                        last_beat = now
-                        yield _sse({"ts": int(now)}, event="ping")
+                # block until an event arrives or the next heartbeat is due,
+                # rather than waking on a fixed timeout and re-checking
+                timeout = next_beat - time.monotonic()
+                if timeout > 0:
+                    try:
+                        item = q.get(timeout=timeout)
+                    except queue.Empty:
+                        pass
+                    else:
+                        # drain what is already queued into a single write
+                        frames = [_sse(item, event=item.get("type"))]
+                        size = len(frames[0])
+                        while size < SSE_BATCH_BYTES:
+                            try:
+                                item = q.get_nowait()
+                            except queue.Empty:
+                                break
+                            frame = _sse(item, event=item.get("type"))
+                            frames.append(frame)
+                            size += len(frame)
+                        yield b"".join(frames)
+                        continue
+                # heartbeat every 15s to keep proxies alive
+                next_beat = time.monotonic() + HEARTBEAT_INTERVAL
+                yield _PING_FMT % int(time.time())
         except GeneratorExit:
             # client disconnected
             return
@@ -68,4 +121,8 @@ def stream():
         "Connection": "keep-alive",
         "X-Accel-Buffering": "no",  # Nginx
     }
-    return Response(generate(), headers=headers)
\ No newline at end of file
+    response = Response(generate(), headers=headers)
+    # runs when the server closes the response, even if the client went
+    # away before the generator started
+    response.call_on_close(lambda: bus.unsubscribe(session_id, q))
+    return response
\ No newline at end of file
@@ -1,35 +1,61 @@
 import os
+from dataclasses import dataclass, field
+from functools import lru_cache
 
+def _env(name: str, default: str):
+    return field(default_factory=lambda: os.getenv(name, default))
+
+def _env_int(name: str, default: str):
+    return field(default_factory=lambda: int(os.getenv(name, default)))
+
+def _env_bool(name: str, default: str, true_values=("true",)):
+    return field(default_factory=lambda: os.getenv(name, default).lower() in true_values)
+
+@dataclass(frozen=True, slots=True)
 class Config:
     # API Keys
-    DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
+    DEEPSEEK_API_KEY: str = _env("DEEPSEEK_API_KEY", "")
 
     # Server settings
-    HOST = os.getenv("HOST", "127.0.0.1")
-    PORT = int(os.getenv("PORT", "8000"))
-    DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+    HOST: str = _env("HOST", "127.0.0.1")
+    PORT: int = _env_int("PORT", "8000")
+    DEBUG: bool = _env_bool("DEBUG", "false")
 
     # Logging Configuration
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    LOG_FILE = os.getenv("LOG_FILE", "logs/term_mcp_deepseek.log")
-    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", "10485760"))
-    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_LEVEL: str = _env("LOG_LEVEL", "INFO")
+    LOG_FILE: str = _env("LOG_FILE", "logs/term_mcp_deepseek.log")
+    LOG_MAX_BYTES: int = _env_int("LOG_MAX_BYTES", "10485760")
+    LOG_BACKUP_COUNT: int = _env_int("LOG_BACKUP_COUNT", "5")
 
     # Session Management
-    SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))
-    MAX_CONCURRENT_SESSIONS = int(os.getenv("MAX_CONCURRENT_SESSIONS", "10"))
+    SESSION_TIMEOUT: int = _env_int("SESSION_TIMEOUT", "3600")
+    MAX_CONCURRENT_SESSIONS: int = _env_int("MAX_CONCURRENT_SESSIONS", "10")
+
+    # Events buffered per SSE session before the oldest are dropped
+    EVENT_QUEUE_SIZE: int = _env_int("EVENT_QUEUE_SIZE", "10000")
+    # Open /stream connections allowed per SSE session
+    SSE_STREAMS_PER_SESSION: int = _env_int("SSE_STREAMS_PER_SESSION", "4")
 
     # Security Configuration
-    SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key_here")
-    JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME")
-    MAX_COMMAND_LENGTH = int(os.getenv("MAX_COMMAND_LENGTH", "1000"))
+    SECRET_KEY: str = _env("SECRET_KEY", "your_secret_key_here")
+    JWT_SECRET: str = _env("JWT_SECRET", "CHANGE_ME")
+    MAX_COMMAND_LENGTH: int = _env_int("MAX_COMMAND_LENGTH", "1000")
+
+    # Run the CMD: lines of one chat reply concurrently, each in its own
+    # process, instead of one after another in the shared terminal session
+    PARALLEL_CMDS: bool = _env_bool("MCP_PARALLEL_CMDS", "false", ("1", "true"))
 
     # DeepSeek Configuration
-    DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
-    DEEPSEEK_URL = os.getenv("DEEPSEEK_URL", "https://api.deepseek.com/chat/completions")
+    DEEPSEEK_MODEL: str = _env("DEEPSEEK_MODEL", "deepseek-chat")
+    DEEPSEEK_URL: str = _env("DEEPSEEK_URL", "https://api.deepseek.com/chat/completions")
 
     # MCP Configuration
-    MCP_VERSION = os.getenv("MCP_VERSION", "1.0.0")
+    MCP_VERSION: str = _env("MCP_VERSION", "1.0.0")
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """The process-wide configuration, read from the environment once"""
+    return Config()
 
-# Create a config instance for backward compatibility
-config = Config()
\ No newline at end of file
+# Shared instance for backward compatibility
+config = get_config()
@@ -1,5 +0,0 @@
-import os
-
-class Config:
-    PORT = int(os.getenv("PORT", "8000"))
-    JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME")
\ No newline at end of file
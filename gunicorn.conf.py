@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+import os
+
+from config import get_config
+
+_config = get_config()
+
+bind = f"{_config.HOST}:{_config.PORT}"
+
+# Threads carry the concurrency: /chat blocks on DeepSeek network I/O, so
+# many threads per worker keep requests flowing. The event bus, session
+# store and shell live in process memory, so a /stream client only sees
+# events from its own worker; keep one worker unless requests are pinned
+# to workers (e.g. sticky sessions by session_id).
+# The app stays WSGI rather than going behind an ASGI adapter: WsgiToAsgi
+# would still run every Flask view on a thread, and Flask's async views
+# start an event loop per request, whereas terminal tools already share
+# MCPServer's one persistent loop.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# SSE streams stay open; gthread workers are not killed for idle streams
+timeout = 120
+keepalive = 5
+
+# never import the app in the master: the pexpect shell must be spawned
+# in the worker that uses it
+preload_app = False
+
+accesslog = "-"
+loglevel = _config.LOG_LEVEL.lower()
@@ -4,21 +4,174 @@ Handles MCP protocol implementation and terminal operations
 """
 
 import asyncio
-from typing import Dict, Any, List
+import concurrent.futures
+import getpass
+import os
+import platform
+import re
+import subprocess
+import threading
+from dataclasses import dataclass
+import orjson
+from typing import Dict, Any, List, Optional
 from tools.command_executor import CommandExecutor
 from tools.tty_output_reader import TtyOutputReader
 from tools.send_control_character import SendControlCharacter
 from tools.json_rpc import JSONRPCError
 from tools.input_validator import InputValidator
-from config import Config
-config = Config()
+from models.event_bus import bus as default_event_bus
+from models.conversation_store import conversation_store as default_conversation_store
+from config import get_config
+config = get_config()
+
+# Upper bound on waiting for a terminal coroutine on the background loop
+COMMAND_TIMEOUT = 60
+
+# Stored messages sent to DeepSeek with each chat turn, besides the system prompt
+CHAT_CONTEXT_MESSAGES = 20
+
+# Owner of the sessions issued to /chat clients (chat is unauthenticated)
+CHAT_USER_ID = "anonymous"
+
+# A trailing shell prompt ($, % or #) on the last output line
+_PROMPT_RE = re.compile(r'[$%#]\s*\Z')
+# A reply line starting with CMD: (leading blanks allowed, never newlines)
+_CMD_RE = re.compile(r'^[^\S\n]*CMD:(.*)$', re.M)
+
+def _current_user() -> str:
+    """Name of the user running the server (no controlling tty needed)"""
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "Unknown"
+
+# Process-wide facts for system://info; none of these change while running
+_SYSTEM_INFO_HEADER = f"""System Information:
+OS: {platform.system()} {platform.release()}
+Platform: {platform.platform()}
+Python: {platform.python_version()}
+"""
+_USER = _current_user()
+
+@dataclass(frozen=True, slots=True)
+class ToolCallArgs:
+    """Typed tools/call arguments; absent keys take each tool's default"""
+    command: str = ""
+    linesOfOutput: Any = 25
+    letter: str = ""
+
+    @classmethod
+    def from_arguments(cls, arguments: Optional[Dict[str, Any]]) -> "ToolCallArgs":
+        """Decode the raw JSON-RPC arguments object once, up front"""
+        if arguments is None:
+            return _NO_ARGS
+        if not isinstance(arguments, dict):
+            raise JSONRPCError(-32602, "Invalid params", "Tool arguments must be an object")
+        return cls(command=arguments.get("command", ""),
+                   linesOfOutput=arguments.get("linesOfOutput", 25),
+                   letter=arguments.get("letter", ""))
+
+_NO_ARGS = ToolCallArgs()
 
 class MCPServer:
     """MCP Server implementation with business logic"""
 
-    def __init__(self, shell):
+    def __init__(self, shell, event_bus=None, conversation_store=None):
         self.shell = shell
         self.jsonrpc_server = None
+        self.event_bus = event_bus or default_event_bus
+        self.conversation_store = conversation_store or default_conversation_store
+
+        # Name -> handler tables; each handler takes a single argument
+        self._tool_dispatch = {
+            "write_to_terminal": self._execute_write_terminal,
+            "read_terminal_output": self._execute_read_terminal,
+            "send_control_character": self._execute_send_control
+        }
+        self._resource_dispatch = {
+            "terminal://output": self._read_terminal_resource,
+            "system://info": self._read_system_info_resource
+        }
+
+        # One long-lived event loop runs every terminal coroutine, instead of
+        # creating and tearing down a loop per request
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                             name="mcp-event-loop", daemon=True)
+        self._loop_thread.start()
+        # Serializes commands on the single shell; created on the loop thread
+        self._shell_lock = None
+        # The prompt marker is installed up front and under the shell lock,
+        # so its setup output never counts as the first command's
+        if shell is not None:
+            asyncio.run_coroutine_threadsafe(self._setup_shell(), self._loop)
+
+        # Static metadata is built (and serialized) once, not per request
+        self._tools_payload = self._build_tools_payload()
+        self._tools_payload_json = orjson.dumps(self._tools_payload)
+        self._prompts_payload = self._build_prompts_payload()
+        self._prompts_payload_json = orjson.dumps(self._prompts_payload)
+        self._prompt_cache = {
+            "terminal_help": self._get_terminal_help_prompt(),
+            "file_operations": self._get_file_operations_prompt(),
+            "system_info": self._get_system_info_prompt(),
+            "process_management": self._get_process_management_prompt()
+        }
+        self._info_payload = self._build_info_payload()
+        self._info_payload_json = orjson.dumps(self._info_payload)
+
+        # roots/list: git top-level per working directory (None if not a repo)
+        self._git_roots: Dict[str, Optional[str]] = {}
+
+        # resources/list: directory listing keyed by (cwd, st_mtime_ns)
+        self._dir_resources_key = None
+        self._dir_resources: List[Dict[str, Any]] = []
+
+    def _run(self, coro):
+        """Run a coroutine on the background loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=COMMAND_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            # stop it on the loop too, or it keeps the shell lock and every
+            # later command queues behind it
+            future.cancel()
+            raise
+
+    def run_terminal_command(self, cmd: str) -> str:
+        """Run a command in the shared terminal from a non-loop thread"""
+        return self._run(self._run_terminal_command(cmd))
+
+    def _get_shell_lock(self) -> asyncio.Lock:
+        """Lock guarding the shell; only called from the background loop"""
+        if self._shell_lock is None:
+            self._shell_lock = asyncio.Lock()
+        return self._shell_lock
+
+    async def _setup_shell(self):
+        """Prepare the shell for commands; runs first on the background loop"""
+        async with self._get_shell_lock():
+            await CommandExecutor(self.shell).setup()
+
+    async def _cancel_pending(self):
+        """Cancel every other task on the loop and wait for them to unwind"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """
+        Stop the background event loop. Work still running on it (the
+        shell setup, a command) is cancelled first, so no task is left
+        pending on a stopped loop.
+        """
+        if not self._loop_thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_pending(), self._loop).result(timeout=5)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
 
     def register_methods(self, jsonrpc_server):
         """Register MCP methods with JSON-RPC server"""
@@ -35,6 +188,14 @@ class MCPServer:
     # MCP Tools
     def list_tools(self) -> Dict[str, Any]:
         """List available MCP tools"""
+        return self._tools_payload
+
+    def list_tools_bytes(self) -> bytes:
+        """Pre-encoded JSON of list_tools()"""
+        return self._tools_payload_json
+
+    def _build_tools_payload(self) -> Dict[str, Any]:
+        """Build the static tools/list result"""
         return {
             "tools": [
                 {
@@ -82,33 +243,25 @@ class MCPServer:
             ]
         }
 
-    def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def call_tool(self, name: str, arguments: Dict[str, Any] = None) -> Dict[str, Any]:
         """Call an MCP tool"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        if name == "write_to_terminal":
-            return self._execute_write_terminal(arguments, loop)
-        elif name == "read_terminal_output":
-            return self._execute_read_terminal(arguments)
-        elif name == "send_control_character":
-            return self._execute_send_control(arguments)
-        else:
+        handler = self._tool_dispatch.get(name)
+        if handler is None:
             raise JSONRPCError(-32601, "Method not found", f"Unknown tool '{name}'")
+        return handler(ToolCallArgs.from_arguments(arguments))
 
-    def _execute_write_terminal(self, arguments: Dict[str, Any], loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+    def _execute_write_terminal(self, args: ToolCallArgs) -> Dict[str, Any]:
         """Execute write_to_terminal tool"""
-        command = InputValidator.sanitize_command(arguments.get("command", ""))
+        command = InputValidator.sanitize_command(args.command)
 
         executor = CommandExecutor(self.shell)
         async def do_write():
-            before_buffer = TtyOutputReader.get_buffer()
-            before_lines = len(before_buffer.split("\n"))
+            async with self._get_shell_lock():
+                before_lines = TtyOutputReader.get_buffer_newline_count()
 
-            await executor.execute_command(command)
+                await executor.execute_command(command)
 
-            after_buffer = TtyOutputReader.get_buffer()
-            after_lines = len(after_buffer.split("\n"))
+                after_lines = TtyOutputReader.get_buffer_newline_count()
             diff = after_lines - before_lines
 
             msg = (f"{diff} lines were output after sending the command to the terminal. "
@@ -116,7 +269,7 @@ class MCPServer:
                    f"Never assume that the command was executed or that it was successful.")
             return msg
 
-        result_msg = loop.run_until_complete(do_write())
+        result_msg = self._run(do_write())
         return {
             "content": [{
                 "type": "text",
@@ -124,9 +277,9 @@ class MCPServer:
             }]
         }
 
-    def _execute_read_terminal(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_read_terminal(self, args: ToolCallArgs) -> Dict[str, Any]:
         """Execute read_terminal_output tool"""
-        lines_of_output = InputValidator.validate_lines_of_output(arguments.get("linesOfOutput", 25))
+        lines_of_output = InputValidator.validate_lines_of_output(args.linesOfOutput)
         output = TtyOutputReader.call(lines_of_output)
         return {
             "content": [{
@@ -135,9 +288,9 @@ class MCPServer:
             }]
         }
 
-    def _execute_send_control(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_send_control(self, args: ToolCallArgs) -> Dict[str, Any]:
         """Execute send_control_character tool"""
-        letter = InputValidator.validate_control_character(arguments.get("letter", ""))
+        letter = InputValidator.validate_control_character(args.letter)
 
         sender = SendControlCharacter(self.shell)
         try:
@@ -155,6 +308,14 @@ class MCPServer:
     # MCP Prompts
     def list_prompts(self) -> Dict[str, Any]:
         """List available MCP prompts"""
+        return self._prompts_payload
+
+    def list_prompts_bytes(self) -> bytes:
+        """Pre-encoded JSON of list_prompts()"""
+        return self._prompts_payload_json
+
+    def _build_prompts_payload(self) -> Dict[str, Any]:
+        """Build the static prompts/list result"""
         return {
             "prompts": [
                 {
@@ -182,17 +343,11 @@ class MCPServer:
 
     def get_prompt(self, name: str, arguments: Dict[str, Any] = None) -> Dict[str, Any]:
         """Get a specific MCP prompt"""
-        prompts = {
-            "terminal_help": self._get_terminal_help_prompt(),
-            "file_operations": self._get_file_operations_prompt(),
-            "system_info": self._get_system_info_prompt(),
-            "process_management": self._get_process_management_prompt()
-        }
-
-        if name not in prompts:
+        prompt = self._prompt_cache.get(name)
+        if prompt is None:
             raise JSONRPCError(-32601, "Method not found", f"Unknown prompt '{name}'")
 
-        return prompts[name]
+        return prompt
 
     def _get_terminal_help_prompt(self) -> Dict[str, Any]:
         """Get terminal help prompt"""
@@ -318,25 +473,8 @@ Monitor system resources and manage process lifecycle effectively."""
         resources = []
 
         try:
-            import os
             cwd = os.getcwd()
-            resources.append({
-                "uri": f"file://{cwd}",
-                "name": "Current Working Directory",
-                "description": f"Current working directory: {cwd}",
-                "mimeType": "inode/directory"
-            })
-
-            # List some files in current directory
-            for item in os.listdir(cwd)[:10]:  # Limit to first 10 items
-                item_path = os.path.join(cwd, item)
-                if os.path.isfile(item_path):
-                    resources.append({
-                        "uri": f"file://{item_path}",
-                        "name": f"File: {item}",
-                        "description": f"File: {item}",
-                        "mimeType": "text/plain"
-                    })
+            resources.extend(self._list_directory_resources(cwd))
         except Exception:
             pass  # Ignore errors when listing resources
 
@@ -358,56 +496,92 @@ Monitor system resources and manage process lifecycle effectively."""
 
         return {"resources": resources}
 
+    def _list_directory_resources(self, cwd: str) -> List[Dict[str, Any]]:
+        """
+        Resources for cwd and the files among its first 10 entries.
+        Cached until the directory's mtime changes.
+        """
+        cache_key = (cwd, os.stat(cwd).st_mtime_ns)
+        if self._dir_resources_key == cache_key:
+            return self._dir_resources
+
+        resources = [{
+            "uri": f"file://{cwd}",
+            "name": "Current Working Directory",
+            "description": f"Current working directory: {cwd}",
+            "mimeType": "inode/directory"
+        }]
+
+        # List some files in current directory
+        with os.scandir(cwd) as entries:
+            for i, entry in enumerate(entries):
+                if i >= 10:  # Limit to first 10 items
+                    break
+                # d_type from the directory read; only symlinks cost a
+                # stat, and one to a file is listed as a file
+                if entry.is_file():
+                    resources.append({
+                        "uri": f"file://{entry.path}",
+                        "name": f"File: {entry.name}",
+                        "description": f"File: {entry.name}",
+                        "mimeType": "text/plain"
+                    })
+
+        self._dir_resources_key = cache_key
+        self._dir_resources = resources
+        return resources
+
     def read_resource(self, uri: str) -> Dict[str, Any]:
         """Read a specific MCP resource"""
-        if uri.startswith("file://"):
-            file_path = uri[7:]  # Remove "file://" prefix
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return {
-                    "contents": [{
-                        "uri": uri,
-                        "mimeType": "text/plain",
-                        "text": content
-                    }]
-                }
-            except Exception as e:
-                raise JSONRPCError(-32603, "Internal error", f"Cannot read file: {str(e)}")
-
-        elif uri == "terminal://output":
-            output = TtyOutputReader.get_buffer()
+        handler = self._resource_dispatch.get(uri)
+        if handler is None:
+            if not uri.startswith("file://"):
+                raise JSONRPCError(-32601, "Method not found", f"Unknown resource URI: {uri}")
+            handler = self._read_file_resource
+        return handler(uri)
+
+    def _read_file_resource(self, uri: str) -> Dict[str, Any]:
+        """Read a file:// resource"""
+        file_path = uri[7:]  # Remove "file://" prefix
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
             return {
                 "contents": [{
                     "uri": uri,
                     "mimeType": "text/plain",
-                    "text": output
+                    "text": content
                 }]
             }
+        except Exception as e:
+            raise JSONRPCError(-32603, "Internal error", f"Cannot read file: {str(e)}")
 
-        elif uri == "system://info":
-            try:
-                import platform
-                import os
-                info = f"""System Information:
-OS: {platform.system()} {platform.release()}
-Platform: {platform.platform()}
-Python: {platform.python_version()}
-Current Directory: {os.getcwd()}
-User: {os.getlogin() if hasattr(os, 'getlogin') else 'Unknown'}
-"""
-                return {
-                    "contents": [{
-                        "uri": uri,
-                        "mimeType": "text/plain",
-                        "text": info
-                    }]
-                }
-            except Exception as e:
-                raise JSONRPCError(-32603, "Internal error", f"Cannot get system info: {str(e)}")
+    def _read_terminal_resource(self, uri: str) -> Dict[str, Any]:
+        """Read the terminal://output resource"""
+        output = TtyOutputReader.get_buffer()
+        return {
+            "contents": [{
+                "uri": uri,
+                "mimeType": "text/plain",
+                "text": output
+            }]
+        }
 
-        else:
-            raise JSONRPCError(-32601, "Method not found", f"Unknown resource URI: {uri}")
+    def _read_system_info_resource(self, uri: str) -> Dict[str, Any]:
+        """Read the system://info resource"""
+        try:
+            info = (f"{_SYSTEM_INFO_HEADER}"
+                    f"Current Directory: {os.getcwd()}\n"
+                    f"User: {_USER}\n")
+            return {
+                "contents": [{
+                    "uri": uri,
+                    "mimeType": "text/plain",
+                    "text": info
+                }]
+            }
+        except Exception as e:
+            raise JSONRPCError(-32603, "Internal error", f"Cannot get system info: {str(e)}")
 
     # MCP Roots
     def list_roots(self) -> Dict[str, Any]:
@@ -442,19 +616,13 @@ User: {os.getlogin() if hasattr(os, 'getlogin') else 'Unknown'}
                 })
 
             # Project directory (if we're in a git repo)
-            try:
-                import subprocess
-                result = subprocess.run(["git", "rev-parse", "--show-toplevel"],
-                                      capture_output=True, text=True, cwd=cwd)
-                if result.returncode == 0:
-                    project_root = result.stdout.strip()
-                    roots.append({
-                        "uri": f"file://{project_root}",
-                        "name": "Project Root",
-                        "description": f"Git project root: {project_root}"
-                    })
-            except:
-                pass  # Git not available or not in repo
+            project_root = self._get_git_root(cwd)
+            if project_root:
+                roots.append({
+                    "uri": f"file://{project_root}",
+                    "name": "Project Root",
+                    "description": f"Git project root: {project_root}"
+                })
 
         except Exception:
             # Fallback to basic roots
@@ -466,107 +634,207 @@ User: {os.getlogin() if hasattr(os, 'getlogin') else 'Unknown'}
 
         return {"roots": roots}
 
+    def _get_git_root(self, cwd: str) -> Optional[str]:
+        """Git top-level for cwd, looked up once per directory and memoized"""
+        if cwd not in self._git_roots:
+            project_root = None
+            try:
+                result = subprocess.run(["git", "rev-parse", "--show-toplevel"],
+                                        capture_output=True, text=True, cwd=cwd)
+                if result.returncode == 0:
+                    project_root = result.stdout.strip() or None
+            except Exception:
+                pass  # Git not available
+            self._git_roots[cwd] = project_root
+        return self._git_roots[cwd]
+
+    def _chat_session_id(self, requested: Any) -> str:
+        """
+        Session whose history a chat turn reads and extends. Only ids issued
+        by the conversation store are honoured, so one client never sees
+        another's history and every history expires with its session; a
+        missing, malformed or expired id gets a fresh session, which the
+        reply hands back to the client.
+        """
+        if requested:
+            try:
+                InputValidator.validate_session_id(requested)
+            except ValueError:
+                pass
+            else:
+                if self.conversation_store.get_session(requested) is not None:
+                    return requested
+        return self.conversation_store.create_session(CHAT_USER_ID).session_id
+
     def handle_chat(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle chat request with DeepSeek API integration"""
-        from tools.deepseek_client import chat, DeepseekError
-        import re
+        """
+        Handle chat request with DeepSeek API integration.
+        The reply is streamed from DeepSeek and every token is published to
+        the session's event bus as it arrives; each CMD: line is started on
+        the background loop as soon as the line is complete, so commands run
+        while the rest of the reply is still being generated.
+        """
+        # requests is imported on the first chat, not at startup
+        from tools.deepseek_client import stream, DeepseekError
 
         message = data.get("message", "").strip()
+        session_id = self._chat_session_id(data.get("session_id"))
         if not message:
             return {
                 "message": "(No message provided)",
-                "session_id": "default"
+                "session_id": session_id
             }
 
         try:
-            # Create conversation with system message
-            conversation = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful AI assistant with terminal access. "
-                        "If you need to run a shell command to answer the user, include a line in your assistant message:\n"
-                        "CMD: the_command_here\n\n"
-                        "The server will intercept that line, run the command, and append the actual output to your final message. "
-                        "Only use 'CMD:' if you truly need to run a command."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": message
-                }
-            ]
-
-            # Call DeepSeek API using the robust client
-            assistant_message = chat(conversation)
-
-            # Check for CMD: instructions and execute them
+            # System prompt plus a bounded tail of this session's history,
+            # so the upload per turn does not grow with the conversation
+            conversation = self.conversation_store.get_recent_conversation(
+                session_id, CHAT_CONTEXT_MESSAGES)
+            conversation.append({"role": "user", "content": message})
+
+            # Stream the reply from DeepSeek, starting each CMD: as soon as
+            # its line is complete
+            chunks = []
+            started = []
+            pending = ""
+            for chunk in stream(conversation):
+                if not chunk:
+                    continue
+                self.event_bus.publish(session_id, {"type": "token", "text": chunk})
+                chunks.append(chunk)
+                pending += chunk
+                if "\n" in pending:
+                    complete, _, pending = pending.rpartition("\n")
+                    # only text that mentions CMD: is scanned
+                    if "CMD:" in complete:
+                        self._start_reply_commands(complete, session_id, started)
+            if "CMD:" in pending:
+                self._start_reply_commands(pending, session_id, started)
+
+            assistant_message = "".join(chunks)
             final_message = assistant_message
             if "CMD:" in assistant_message:
-                lines = assistant_message.split("\n")
-                final_lines = []
-
-                for line in lines:
-                    if line.strip().startswith("CMD:"):
-                        cmd = line.strip()[len("CMD:"):].strip()
-                        if cmd:
-                            try:
-                                # Execute the command
-                                loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(loop)
-
-                                executor = CommandExecutor(self.shell)
-                                async def run_cmd():
-                                    before_buffer = TtyOutputReader.get_buffer()
-                                    before_lines = len(before_buffer.split("\n"))
-
-                                    await executor.execute_command(cmd)
-
-                                    after_buffer = TtyOutputReader.get_buffer()
-                                    after_lines = len(after_buffer.split("\n"))
-                                    diff = after_lines - before_lines
-
-                                    lines_of_output = diff if diff > 0 else 25
-                                    new_output = TtyOutputReader.call(lines_of_output)
-
-                                    # Remove trailing prompt
-                                    last_line = new_output.strip().split("\n")[-1]
-                                    if re.search(r'(\$|%|#)\s*$', last_line):
-                                        splitted = new_output.strip().split("\n")
-                                        splitted.pop()
-                                        new_output = "\n".join(splitted)
-
-                                    return new_output.strip() or "(No output)"
-
-                                output = loop.run_until_complete(run_cmd())
-                                final_lines.append(f"(Ran: {cmd})\n{output}")
-                            except Exception as e:
-                                final_lines.append(f"(Error running '{cmd}': {e})")
-                        else:
-                            final_lines.append("(No command specified.)")
-                    else:
-                        final_lines.append(line)
-
-                final_message = "\n".join(final_lines).strip()
+                final_message = self._splice_command_output(assistant_message, started)
+
+            self.conversation_store.add_message(session_id, "user", message)
+            self.conversation_store.add_message(session_id, "assistant", final_message)
 
             return {
                 "message": final_message,
-                "session_id": "default"
+                "session_id": session_id
             }
 
         except DeepseekError as e:
             return {
                 "message": f"DeepSeek API Error: {str(e)}",
-                "session_id": "default"
+                "session_id": session_id
             }
         except Exception as e:
             return {
                 "message": f"Error: {str(e)}",
-                "session_id": "default"
+                "session_id": session_id
             }
 
+    def _start_reply_commands(self, text: str, session_id: str, started: list):
+        """Start every non-empty CMD: of some complete reply lines on the background loop"""
+        for match in _CMD_RE.finditer(text):
+            cmd = match.group(1).strip()
+            if cmd:
+                future = asyncio.run_coroutine_threadsafe(
+                    self._run_chat_command(cmd, session_id), self._loop)
+                started.append((cmd, future))
+
+    def _splice_command_output(self, assistant_message: str, started: list) -> str:
+        """Replace each CMD: line of the reply with its command's output"""
+        # the commands already run concurrently; wait for all of them
+        # against one shared deadline rather than one timeout apiece
+        if started:
+            concurrent.futures.wait([future for _, future in started],
+                                    timeout=COMMAND_TIMEOUT)
+        results = iter(started)
+        parts = []
+        prev_end = 0
+        for match in _CMD_RE.finditer(assistant_message):
+            parts.append(assistant_message[prev_end:match.start()])
+            prev_end = match.end()
+            if not match.group(1).strip():
+                parts.append("(No command specified.)")
+                continue
+            cmd, future = next(results)
+            if not future.done():
+                future.cancel()
+                parts.append(f"(Error running '{cmd}': timed out after {COMMAND_TIMEOUT}s)")
+                continue
+            try:
+                output = future.result()
+                parts.append(f"(Ran: {cmd})\n{output}")
+            except Exception as e:
+                parts.append(f"(Error running '{cmd}': {e})")
+        parts.append(assistant_message[prev_end:])
+
+        return "".join(parts).strip()
+
+    async def _run_chat_command(self, cmd: str, session_id: str) -> str:
+        """Run one CMD: from a chat reply and return its trimmed output"""
+        self.event_bus.publish(session_id, {"type": "command_start", "command": cmd})
+        try:
+            if config.PARALLEL_CMDS:
+                output = await self._run_isolated_command(cmd)
+            else:
+                output = await self._run_terminal_command(cmd)
+        except Exception as e:
+            self.event_bus.publish(session_id, {"type": "command_error", "command": cmd, "error": str(e)})
+            raise
+
+        self.event_bus.publish(session_id, {"type": "command_complete", "command": cmd, "output": output})
+        return output
+
+    async def _run_terminal_command(self, cmd: str) -> str:
+        """Run a command in the shared terminal session and return its new output"""
+        async with self._get_shell_lock():
+            executor = CommandExecutor(self.shell)
+            before_lines = TtyOutputReader.get_buffer_newline_count()
+
+            await executor.execute_command(cmd)
+
+            after_lines = TtyOutputReader.get_buffer_newline_count()
+            diff = after_lines - before_lines
+
+            lines_of_output = diff if diff > 0 else 25
+            new_output = TtyOutputReader.call(lines_of_output)
+
+        # Remove trailing prompt, matching the last line in place
+        new_output = new_output.strip()
+        idx = new_output.rfind("\n")
+        if _PROMPT_RE.search(new_output, idx + 1):
+            new_output = new_output[:idx] if idx >= 0 else ""
+
+        return new_output.strip() or "(No output)"
+
+    async def _run_isolated_command(self, cmd: str) -> str:
+        """Run a command in its own shell process so several can overlap"""
+        proc = await asyncio.create_subprocess_shell(
+            cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            cwd=os.getcwd())
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout=COMMAND_TIMEOUT)
+        finally:
+            # timed out, or cancelled when the turn's shared deadline passed
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return out.decode("utf-8", errors="replace").strip() or "(No output)"
+
     def get_info(self) -> Dict[str, Any]:
         """Get server information"""
+        return self._info_payload
+
+    def get_info_bytes(self) -> bytes:
+        """Pre-encoded JSON of get_info()"""
+        return self._info_payload_json
+
+    def _build_info_payload(self) -> Dict[str, Any]:
+        """Build the static server information"""
         return {
             "name": "term-mcp-deepseek",
             "version": "1.0.0",
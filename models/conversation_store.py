@@ -3,112 +3,219 @@ Conversation Store and Session Management
 Manages conversations and sessions for different users
 """
 
+import heapq
 import threading
 import time
 import secrets
-from typing import Dict, List, Any, Optional
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Any, Optional, Set
 from config import config
+from models.event_bus import EventBus, bus as default_event_bus
+
+# Random bytes per session id: 128 bits, 22 url-safe characters
+SESSION_ID_BYTES = 16
 
 class Session:
     """Represents a user session"""
 
     def __init__(self, user_id: str, client_id: str = None):
-        self.session_id = secrets.token_urlsafe(32)
+        self.session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
         self.user_id = user_id
         self.client_id = client_id or user_id
-        self.created_at = time.time()
-        self.last_activity = time.time()
+        # monotonic clock: expiry is unaffected by wall-clock steps
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
         self.is_active = True
 
-    def update_activity(self):
+    def update_activity(self, now: float = None):
         """Update last activity timestamp"""
-        self.last_activity = time.time()
+        self.last_activity = time.monotonic() if now is None else now
 
     def is_expired(self) -> bool:
         """Check if session has expired"""
-        return (time.time() - self.last_activity) > config.SESSION_TIMEOUT
+        return self.is_expired_at(time.monotonic())
+
+    def is_expired_at(self, now: float) -> bool:
+        """Check expiry against a time.monotonic() value taken by the caller"""
+        return (now - self.last_activity) > config.SESSION_TIMEOUT
 
     def get_age(self) -> float:
         """Get session age in seconds"""
-        return time.time() - self.created_at
+        return time.monotonic() - self.created_at
+
+# Number of per-session lock stripes (power of two)
+LOCK_STRIPES = 64
+
+# Messages kept per conversation, besides the system prompt
+MAX_HISTORY = 99
+
+# Expired sessions reclaimed by each create_session call
+SWEEP_ON_CREATE = 2
+
+# Upper bound on sessions reclaimed by one cleanup_expired_sessions call
+SWEEP_BATCH = 1000
 
 class ConversationStore:
-    """Thread-safe conversation and session storage"""
+    """
+    Thread-safe conversation and session storage.
+    Per-session work takes one of LOCK_STRIPES locks chosen by session id;
+    _struct_lock is held only briefly to add or remove dict keys and to
+    snapshot the dicts for scans. Lock order: stripe, then _struct_lock.
+    Expiry is tracked lazily in a min-heap of (deadline, session id) under
+    _heap_lock, which is never held while taking another lock.
+    """
 
-    def __init__(self):
-        self._conversations: Dict[str, List[Dict[str, Any]]] = {}
+    def __init__(self, event_bus: Optional[EventBus] = None):
+        # a session's stream queue is closed along with the session
+        self.event_bus = event_bus or default_event_bus
+        # session id -> bounded message history (system prompt kept apart)
+        self._conversations: Dict[str, deque] = {}
         self._sessions: Dict[str, Session] = {}
-        self._lock = threading.Lock()
-        self._default_conversation = self._create_default_conversation()
-
-    def _create_default_conversation(self) -> List[Dict[str, Any]]:
-        """Create the default system conversation"""
-        return [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful AI assistant with terminal access. "
-                    "If you need to run a shell command to answer the user, include a line in your assistant message:\n"
-                    "CMD: the_command_here\n\n"
-                    "The server will intercept that line, run the command, and append the actual output to your final message. "
-                    "Only use 'CMD:' if you truly need to run a command."
-                )
-            }
-        ]
+        # user id -> ids of that user's live sessions (guarded by _struct_lock)
+        self._user_index: Dict[str, Set[str]] = {}
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._struct_lock = threading.Lock()
+        # (expiry deadline, session id); deadlines may be stale, see _sweep
+        self._expiry_heap: List[tuple] = []
+        self._heap_lock = threading.Lock()
+        # the system prompt is a store-wide invariant, never part of a history
+        self._system_msg = self._create_system_message()
+
+    def _stripe(self, session_id: str) -> threading.Lock:
+        """Lock stripe guarding a session's conversation and session data"""
+        return self._stripes[hash(session_id) & (LOCK_STRIPES - 1)]
+
+    def _create_system_message(self) -> Dict[str, Any]:
+        """Create the system prompt that leads every conversation"""
+        return {
+            "role": "system",
+            "content": (
+                "You are a helpful AI assistant with terminal access. "
+                "If you need to run a shell command to answer the user, include a line in your assistant message:\n"
+                "CMD: the_command_here\n\n"
+                "The server will intercept that line, run the command, and append the actual output to your final message. "
+                "Only use 'CMD:' if you truly need to run a command."
+            )
+        }
+
+    def _history_for(self, session_id: str) -> deque:
+        """
+        Get or create a message history; caller holds the session's stripe.
+        Only sessions from create_session keep one, so every stored history
+        is reclaimed with its session; any other id gets a throwaway deque.
+        """
+        history = self._conversations.get(session_id)
+        if history is None:
+            if session_id not in self._sessions:
+                return deque(maxlen=MAX_HISTORY)
+            with self._struct_lock:
+                history = self._conversations.setdefault(
+                    session_id, deque(maxlen=MAX_HISTORY))
+        return history
 
     def get_conversation(self, session_id: str) -> List[Dict[str, Any]]:
-        """Get conversation for a session, creating if it doesn't exist"""
-        with self._lock:
-            if session_id not in self._conversations:
-                self._conversations[session_id] = self._default_conversation.copy()
-            return self._conversations[session_id]
+        """
+        Get conversation for a session, creating if it doesn't exist.
+        Returns a new list (system prompt first) for sending to the API;
+        use add_message / clear_conversation to change the stored history.
+        Ids that are not live sessions have no history, so adding to one
+        is a no-op.
+        """
+        with self._stripe(session_id):
+            return [self._system_msg, *self._history_for(session_id)]
+
+    def get_recent_conversation(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Like get_conversation, but only the last ``limit`` stored messages
+        follow the system prompt, bounding what each API call uploads.
+        """
+        with self._stripe(session_id):
+            history = self._history_for(session_id)
+            skip = max(len(history) - limit, 0)
+            return [self._system_msg, *islice(history, skip, None)]
 
     def add_message(self, session_id: str, role: str, content: str):
-        """Add a message to a conversation"""
-        with self._lock:
-            conversation = self.get_conversation(session_id)
-            conversation.append({
+        """Add a message to a conversation; the oldest falls off past MAX_HISTORY"""
+        # Messages are deliberately not pooled/recycled: get_conversation()
+        # hands these dicts to callers, so clearing an evicted one could
+        # corrupt a request still in flight. CPython's dict free list
+        # already reuses the memory of evicted messages.
+        with self._stripe(session_id):
+            self._history_for(session_id).append({
                 "role": role,
                 "content": content
             })
 
-            # Limit conversation length to prevent memory issues
-            if len(conversation) > 100:  # Keep last 100 messages
-                # Keep system message and last 99 messages
-                system_msg = conversation[0] if conversation[0]["role"] == "system" else None
-                if system_msg:
-                    conversation[:] = [system_msg] + conversation[-99:]
-                else:
-                    conversation[:] = conversation[-99:]
-
     def clear_conversation(self, session_id: str):
         """Clear conversation for a session"""
-        with self._lock:
-            if session_id in self._conversations:
-                self._conversations[session_id] = self._default_conversation.copy()
+        with self._stripe(session_id):
+            history = self._conversations.get(session_id)
+            if history is not None:
+                history.clear()
 
     def get_all_sessions(self) -> List[str]:
         """Get all active session IDs"""
-        with self._lock:
+        with self._struct_lock:
             return list(self._conversations.keys())
 
     def create_session(self, user_id: str, client_id: str = None) -> Session:
         """Create a new session for a user"""
-        with self._lock:
-            session = Session(user_id, client_id)
-            self._sessions[session.session_id] = session
-            return session
+        # amortize cleanup: every new session pays for a couple of old ones
+        self._sweep(SWEEP_ON_CREATE)
+        session = Session(user_id, client_id)
+        with self._stripe(session.session_id):
+            with self._struct_lock:
+                self._sessions[session.session_id] = session
+                self._user_index.setdefault(user_id, set()).add(session.session_id)
+        self._push_expiry(session)
+        return session
+
+    def _push_expiry(self, session: Session):
+        """Schedule a session to be looked at once it could have expired"""
+        deadline = session.last_activity + config.SESSION_TIMEOUT
+        with self._heap_lock:
+            heapq.heappush(self._expiry_heap, (deadline, session.session_id))
+
+    def _sweep(self, limit: int) -> int:
+        """
+        Reclaim up to ``limit`` expired sessions; returns how many were removed.
+        Activity does not touch the heap, so a due entry may belong to a
+        session used since it was pushed: that one is rescheduled instead.
+        """
+        now = time.monotonic()
+        due = []
+        with self._heap_lock:
+            heap = self._expiry_heap
+            while heap and len(due) < limit and heap[0][0] < now:
+                due.append(heapq.heappop(heap)[1])
+
+        removed = 0
+        for session_id in due:
+            with self._stripe(session_id):
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                if session.is_expired_at(now):
+                    with self._struct_lock:
+                        self._cleanup_session(session_id)
+                    removed += 1
+                    continue
+            self._push_expiry(session)
+        return removed
 
     def get_session(self, session_id: str) -> Optional[Session]:
         """Get session by ID"""
-        with self._lock:
+        with self._stripe(session_id):
             session = self._sessions.get(session_id)
-            if session and not session.is_expired():
-                session.update_activity()
+            now = time.monotonic()
+            if session and not session.is_expired_at(now):
+                session.update_activity(now)
                 return session
-            elif session and session.is_expired():
+            elif session:
                 # Clean up expired session
-                self._cleanup_session(session_id)
+                with self._struct_lock:
+                    self._cleanup_session(session_id)
             return None
 
     def validate_session(self, session_id: str, user_id: str = None) -> bool:
@@ -122,49 +229,65 @@ class ConversationStore:
 
     def get_user_sessions(self, user_id: str) -> List[Session]:
         """Get all active sessions for a user"""
-        with self._lock:
-            return [s for s in self._sessions.values()
-                   if s.user_id == user_id and not s.is_expired()]
+        with self._struct_lock:
+            sessions = [self._sessions[sid] for sid in self._user_index.get(user_id, ())]
+        now = time.monotonic()
+        return [s for s in sessions if not s.is_expired_at(now)]
 
     def end_session(self, session_id: str):
         """End a session"""
-        with self._lock:
-            if session_id in self._sessions:
-                self._sessions[session_id].is_active = False
+        with self._stripe(session_id):
+            session = self._sessions.get(session_id)
+            if session:
+                session.is_active = False
                 # Clean up conversation
-                if session_id in self._conversations:
-                    del self._conversations[session_id]
+                with self._struct_lock:
+                    self._conversations.pop(session_id, None)
+                    self._unindex_session(session)
+                self.event_bus.close(session_id)
 
     def _cleanup_session(self, session_id: str):
-        """Clean up a session and its data"""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
+        """Clean up a session and its data; caller holds _struct_lock"""
+        session = self._sessions.pop(session_id, None)
+        if session:
+            self._unindex_session(session)
         if session_id in self._conversations:
             del self._conversations[session_id]
+        self.event_bus.close(session_id)
 
-    def cleanup_expired_sessions(self):
-        """Clean up all expired sessions"""
-        with self._lock:
-            expired_sessions = []
-            for session_id, session in self._sessions.items():
-                if session.is_expired():
-                    expired_sessions.append(session_id)
+    def _unindex_session(self, session: Session):
+        """Drop a session from the user index; caller holds _struct_lock"""
+        user_sessions = self._user_index.get(session.user_id)
+        if user_sessions is not None:
+            user_sessions.discard(session.session_id)
+            if not user_sessions:
+                del self._user_index[session.user_id]
 
-            for session_id in expired_sessions:
-                self._cleanup_session(session_id)
+    def cleanup_expired_sessions(self, limit: int = SWEEP_BATCH) -> int:
+        """Clean up at most ``limit`` expired sessions; returns how many were removed"""
+        return self._sweep(limit)
 
     def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics"""
-        with self._lock:
-            active_sessions = sum(1 for s in self._sessions.values() if not s.is_expired())
+        with self._struct_lock:
+            sessions = list(self._sessions.values())
             total_conversations = len(self._conversations)
 
-            return {
-                "active_sessions": active_sessions,
-                "total_sessions": len(self._sessions),
-                "total_conversations": total_conversations,
-                "active_users": len(set(s.user_id for s in self._sessions.values() if not s.is_expired()))
-            }
+        # one pass for both the active count and the active users
+        active_users = set()
+        active_sessions = 0
+        now = time.monotonic()
+        for s in sessions:
+            if not s.is_expired_at(now):
+                active_sessions += 1
+                active_users.add(s.user_id)
+
+        return {
+            "active_sessions": active_sessions,
+            "total_sessions": len(sessions),
+            "total_conversations": total_conversations,
+            "active_users": len(active_users)
+        }
 
 # Global conversation store instance
 conversation_store = ConversationStore()
\ No newline at end of file
@@ -1,31 +1,98 @@
 import time, queue, threading
-from typing import Dict
+from collections import deque
+from typing import Dict, Optional
+from config import config
+
+class EventQueue:
+    """
+    Bounded per-session event buffer: a deque(maxlen) ring plus an Event
+    to wake the consumer. When full, append drops the oldest event.
+    get()/get_nowait() raise queue.Empty like queue.Queue.
+    """
+
+    def __init__(self, maxsize: int):
+        self.items = deque(maxlen=maxsize)
+        self.ready = threading.Event()
+        # streams currently subscribed (see EventBus.subscribe)
+        self.readers = 0
+
+    def put(self, event: dict):
+        self.items.append(event)
+        self.ready.set()
+
+    def get_nowait(self) -> dict:
+        try:
+            return self.items.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    def get(self, timeout: Optional[float] = None) -> dict:
+        while True:
+            try:
+                return self.items.popleft()
+            except IndexError:
+                pass
+            self.ready.clear()
+            # re-check: an event may have landed just before the clear
+            if self.items:
+                continue
+            if not self.ready.wait(timeout):
+                raise queue.Empty
+
+    def empty(self) -> bool:
+        return not self.items
 
 class EventBus:
-    def __init__(self):
-        self.queues: Dict[str, queue.Queue] = {}
+    def __init__(self, maxsize: Optional[int] = None, max_readers: Optional[int] = None):
+        self.queues: Dict[str, EventQueue] = {}
         self.lock = threading.Lock()
+        self.maxsize = config.EVENT_QUEUE_SIZE if maxsize is None else maxsize
+        self.max_readers = config.SSE_STREAMS_PER_SESSION if max_readers is None else max_readers
 
-    def get(self, session_id: str) -> queue.Queue:
+    def get(self, session_id: str) -> EventQueue:
+        # dict reads are atomic under the GIL: only creation takes the lock
+        q = self.queues.get(session_id)
+        if q is not None:
+            return q
         with self.lock:
             q = self.queues.get(session_id)
             if q is None:
-                q = queue.Queue(maxsize=1024)
+                q = EventQueue(self.maxsize)
                 self.queues[session_id] = q
             return q
 
-    def publish(self, session_id: str, event: dict):
+    def subscribe(self, session_id: str) -> Optional[EventQueue]:
+        """
+        Register a stream reading the session's queue. Returns None once the
+        session already has max_readers streams: each open stream holds a
+        server thread, and readers of one queue split its events anyway.
+        """
         q = self.get(session_id)
-        try:
-            q.put_nowait(event)
-        except queue.Full:
-            # drop oldest to keep stream live
-            try: q.get_nowait()
-            except Exception: pass
-            q.put_nowait(event)
+        with self.lock:
+            if q.readers >= self.max_readers:
+                return None
+            q.readers += 1
+        return q
+
+    def unsubscribe(self, session_id: str, q: EventQueue):
+        """Release a stream registered with subscribe(); the last one drops the queue"""
+        with self.lock:
+            q.readers -= 1
+            if q.readers == 0 and self.queues.get(session_id) is q:
+                del self.queues[session_id]
+
+    def publish(self, session_id: str, event: dict):
+        """
+        Queue an event for the session's open streams. With no stream there
+        is no one to read it, so no queue is created and the event is dropped.
+        """
+        q = self.queues.get(session_id)
+        if q is not None and q.readers:
+            # a full queue drops its oldest event to keep the stream live
+            q.put(event)
 
     def close(self, session_id: str):
         with self.lock:
             self.queues.pop(session_id, None)
 
-bus = EventBus()
\ No newline at end of file
+bus = EventBus()
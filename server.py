@@ -7,17 +7,19 @@ import os
 import logging
 import logging.handlers
 import asyncio
-import requests
 from flask import Flask, request, g
 import pexpect
 
 from config import config
 from mcp_server import MCPServer
-from models.conversation_store import conversation_store
+from models.conversation_store import conversation_store, SWEEP_BATCH
 from tools.auth import init_oauth_app, require_auth
 from tools.json_rpc import JSONRPCServer
 from tools.error_handler import error_handler, MCPError
 from tools.rate_limiter import security_middleware, require_security_check
+from tools.utils import install_event_loop_policy
+from tools.json_provider import install_json_provider
+from tools.deepseek_client import iter_deltas, session as deepseek_session
 
 # Setup logging
 def setup_logging():
@@ -55,31 +57,37 @@ def setup_logging():
 # Initialize logging
 logger = setup_logging()
 
+# Prefer uvloop for the event loops driving terminal commands
+if install_event_loop_policy():
+    logger.info("uvloop event loop policy installed")
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = config.SECRET_KEY
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+# orjson serializes every JSON response (always compact) and parses request bodies
+install_json_provider(app)
+
+# CORS headers, shared with the OPTIONS preflight handler
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
+}
+
+# MCP, CORS and security headers never vary, so they are merged once
+_STATIC_HEADERS = {
+    'X-MCP-Version': config.MCP_VERSION,
+    'X-MCP-Transport': 'http',
+    'Cache-Control': 'no-cache',
+    **_CORS_HEADERS,
+    **security_middleware.get_security_headers(),
+}
 
 # Add security and MCP headers
 @app.after_request
 def add_security_headers(response):
     """Add security, MCP, and CORS headers to all responses"""
-    # MCP headers
-    response.headers['Content-Type'] = 'application/json'
-    response.headers['X-MCP-Version'] = config.MCP_VERSION
-    response.headers['X-MCP-Transport'] = 'http'
-    response.headers['Cache-Control'] = 'no-cache'
-
-    # CORS headers
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
-
-    # Security headers
-    security_headers = security_middleware.get_security_headers()
-    for header, value in security_headers.items():
-        response.headers[header] = value
-
+    response.headers.update(_STATIC_HEADERS)
     return response
 
 # Apply security checks before processing requests
@@ -116,9 +124,7 @@ def security_check():
 @app.route('/mcp/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
     response = app.response_class()
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+    response.headers.update(_CORS_HEADERS)
     return response
 
 # Initialize OAuth2
@@ -146,112 +152,22 @@ def handle_mcp_error(error):
 #######################################
 # Helper Functions
 #######################################
-async def run_shell_command(cmd: str) -> str:
-    """
-    2-step approach behind the scenes:
-     1) write_to_terminal => run the command
-     2) read_terminal_output => retrieve newly produced lines
-    Return the actual lines as a string
-    """
-    from tools.command_executor import CommandExecutor
-    from tools.tty_output_reader import TtyOutputReader
-    from tools.utils import sleep
-    import re
-
-    # We'll do it similarly to the 'call_tool' approach
-    executor = CommandExecutor(shell)
-
-    before_buffer = TtyOutputReader.get_buffer()
-    before_lines = len(before_buffer.split("\n"))
-
-    # run command
-    await executor.execute_command(cmd)
-
-    after_buffer = TtyOutputReader.get_buffer()
-    after_lines = len(after_buffer.split("\n"))
-    diff = after_lines - before_lines
-    # read new lines
-    lines_of_output = diff if diff > 0 else 25
-    new_output = TtyOutputReader.call(lines_of_output)
-
-    # Attempt to remove a trailing prompt line if present
-    last_line = new_output.strip().split("\n")[-1]
-    if re.search(r'(\$|%|#)\s*$', last_line):
-        # If the last line looks like a prompt, remove it
-        splitted = new_output.strip().split("\n")
-        splitted.pop()
-        new_output = "\n".join(splitted)
-    return new_output.strip() or "(No output)"
-
-def call_deepseek_api(messages):
-    """
-    Sends the conversation to DeepSeek. Returns the model's text.
-    For reference:
-      POST /chat/completions
-      {
-        "model": "deepseek-chat",
-        "messages": [ {role, content}, ... ],
-        "stream": false
-      }
-    With header "Authorization: Bearer <DEEPSEEK_API_KEY>"
-    """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
-    }
-    payload = {
-        "model": config.DEEPSEEK_MODEL,
-        "messages": messages,
-        "stream": False
-    }
-    resp = requests.post(config.DEEPSEEK_URL, headers=headers, json=payload, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
-    # DeepSeek might store the model's text in data["choices"][0]["message"]["content"]
-    return data["choices"][0]["message"]["content"]
-
-
-#######################################
-# Helper: run a command behind the scenes
-#######################################
-async def run_shell_command(cmd: str) -> str:
+def run_shell_command(cmd: str) -> str:
     """
     2-step approach behind the scenes:
      1) write_to_terminal => run the command
      2) read_terminal_output => retrieve newly produced lines
-    Return the actual lines as a string
+    Return the actual lines as a string.
+    Runs on the MCP server's persistent event loop under its shell lock,
+    so no loop is created per call and commands never interleave.
     """
-    # We'll do it similarly to the 'call_tool' approach
-    from tools.command_executor import CommandExecutor
-    executor = CommandExecutor(shell)
-
-    before_buffer = TtyOutputReader.get_buffer()
-    before_lines = len(before_buffer.split("\n"))
-
-    # run command
-    await executor.execute_command(cmd)
-
-    after_buffer = TtyOutputReader.get_buffer()
-    after_lines = len(after_buffer.split("\n"))
-    diff = after_lines - before_lines
-    # read new lines
-    lines_of_output = diff if diff > 0 else 25
-    new_output = TtyOutputReader.call(lines_of_output)
-
-    # Attempt to remove a trailing prompt line if present
-    last_line = new_output.strip().split("\n")[-1]
-    if re.search(r'(\$|%|#)\s*$', last_line):
-        # If the last line looks like a prompt, remove it
-        splitted = new_output.strip().split("\n")
-        splitted.pop()
-        new_output = "\n".join(splitted)
-    return new_output.strip() or "(No output)"
+    return mcp_server.run_terminal_command(cmd)
 
-#######################################
-# DeepSeek Chat
-#######################################
-DEEPSEEK_URL = "https://api.deepseek.com/chat/completions"
-DEEPSEEK_MODEL = "deepseek-chat"   # adjust if you have a different model name
+# built once: the API key is fixed for the life of the process
+_DEEPSEEK_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {config.DEEPSEEK_API_KEY}"
+}
 
 def call_deepseek_api(messages):
     """
@@ -261,30 +177,21 @@ def call_deepseek_api(messages):
       {
         "model": "deepseek-chat",
         "messages": [ {role, content}, ... ],
-        "stream": false
+        "stream": true
       }
     With header "Authorization: Bearer <DEEPSEEK_API_KEY>"
+    The reply is streamed and joined, so the connection goes back to the
+    pool as soon as the last delta arrives.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
     payload = {
-        "model": DEEPSEEK_MODEL,
+        "model": config.DEEPSEEK_MODEL,
         "messages": messages,
-        "stream": False
+        "stream": True
     }
-    resp = requests.post(DEEPSEEK_URL, headers=headers, json=payload, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
-    # DeepSeek might store the model's text in data["choices"][0]["message"]["content"]
-    return data["choices"][0]["message"]["content"]
-
-
-
-
-
-
+    with deepseek_session.post(config.DEEPSEEK_URL, headers=_DEEPSEEK_HEADERS,
+                               json=payload, timeout=60, stream=True) as resp:
+        resp.raise_for_status()
+        return "".join(iter_deltas(resp))
 
 
 def cleanup_sessions():
@@ -296,8 +203,14 @@ def cleanup_sessions():
         while True:
             time.sleep(300)  # Clean up every 5 minutes
             try:
-                conversation_store.cleanup_expired_sessions()
-                logger.info("Cleaned up expired sessions")
+                # bounded batches keep each sweep's lock traffic short;
+                # create_session already reclaims most sessions as it goes
+                removed = batch = conversation_store.cleanup_expired_sessions()
+                while batch == SWEEP_BATCH:
+                    time.sleep(0.01)
+                    batch = conversation_store.cleanup_expired_sessions()
+                    removed += batch
+                logger.info(f"Cleaned up {removed} expired sessions")
             except Exception as e:
                 logger.error(f"Error during session cleanup: {e}")
 
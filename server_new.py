@@ -3,41 +3,54 @@ from flask import Flask, request, jsonify
 from werkzeug.middleware.proxy_fix import ProxyFix
 from api.routes import bp as api_bp
 from mcp_server import MCPServer
-from config import Config
+from config import Config, get_config
 from models.event_bus import bus as event_bus
+from tools.utils import install_event_loop_policy
+from tools.json_provider import install_json_provider
 
-def create_app(config_obj: type[Config] = Config) -> Flask:
+# static, so the CSP string and header table are built once at import
+_SECURITY_HEADERS = (
+    ("Content-Security-Policy", (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com https://cdnjs.cloudflare.com; "
+        "style-src 'self' 'unsafe-inline' https://cdnjs.cloudflare.com https://fonts.googleapis.com; "
+        "font-src 'self' https://cdnjs.cloudflare.com https://fonts.gstatic.com; "
+        "img-src 'self' data: https:; "
+        "connect-src 'self' https://api.deepseek.com;"
+    )),
+    ("X-Content-Type-Options", "nosniff"),
+    ("Strict-Transport-Security", "max-age=63072000; includeSubDomains; preload"),
+    ("X-Frame-Options", "DENY"),
+    ("X-XSS-Protection", "1; mode=block"),
+)
+
+def create_app(config_obj: Config | None = None) -> Flask:
     app = Flask(__name__)
-    app.config.from_object(config_obj)
+    app.config.from_object(config_obj or get_config())
+    # orjson for jsonify() / get_json() instead of the stdlib json module
+    install_json_provider(app)
+
+    # uvloop-backed loops for the terminal tool coroutines (no-op if unavailable)
+    install_event_loop_policy()
 
     # security headers
     @app.after_request
     def set_headers(resp):
-        resp.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com https://cdnjs.cloudflare.com; "
-            "style-src 'self' 'unsafe-inline' https://cdnjs.cloudflare.com https://fonts.googleapis.com; "
-            "font-src 'self' https://cdnjs.cloudflare.com https://fonts.gstatic.com; "
-            "img-src 'self' data: https:; "
-            "connect-src 'self' https://api.deepseek.com;"
-        )
-        resp.headers["X-Content-Type-Options"] = "nosniff"
-        resp.headers["Strict-Transport-Security"] = "max-age=63072000; includeSubDomains; preload"
-        resp.headers["X-Frame-Options"] = "DENY"
-        resp.headers["X-XSS-Protection"] = "1; mode=block"
+        resp.headers.update(_SECURITY_HEADERS)
         return resp
 
     # attach business logic
     import pexpect
     shell = pexpect.spawn('/bin/bash', encoding='utf-8', echo=False)
-    app.mcp = MCPServer(shell)
+    app.mcp = MCPServer(shell, event_bus=event_bus)
 
     # attach event bus for SSE
     app.event_bus = event_bus
 
-    # Hook JWT secret into auth module
-    from tools import auth as auth_module
-    auth_module.auth = auth_module.JWTAuth(secret=app.config["JWT_SECRET"])
+    # Hook JWT secret into the auth module's singleton, so modules that
+    # imported `auth` keep verifying with the configured key
+    from tools.auth import auth
+    auth.set_secret(app.config["JWT_SECRET"])
 
     # rate limiter and input validation likely already integrated via WSGI or decorators
 
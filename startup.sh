@@ -100,8 +100,11 @@ echo "Starting server on port $PORT..."
 # export port
 export PORT=$PORT
 
-# run
-exec python server_new.py
+# run: Werkzeug's dev server when debugging, gunicorn otherwise
+if [ "${DEBUG:-false}" = "true" ]; then
+  exec python server_new.py
+fi
+exec gunicorn -c gunicorn.conf.py wsgi:application
 
 # Function to print colored output
 print_info() {
@@ -5,17 +5,16 @@ This script runs the MCP server using standard input/output for communication,
 which is useful for command-line integration and local clients.
 """
 
+import os
 import sys
-import json
 import asyncio
 import logging
-from tools.json_rpc import JSONRPCServer, JSONRPCError
-
-# Import our MCP methods
-from server import (
-    mcp_list_tools, mcp_call_tool, mcp_list_prompts, mcp_get_prompt,
-    mcp_list_resources, mcp_read_resource, mcp_list_roots
-)
+import threading
+import orjson
+import pexpect
+from tools.json_rpc import JSONRPCServer, JSONRPCError, is_notification
+from mcp_server import MCPServer
+from tools.utils import install_event_loop_policy
 
 def setup_stdio_logging():
     """Setup logging for STDIO mode"""
@@ -26,82 +25,152 @@ def setup_stdio_logging():
     )
     return logging.getLogger("mcp_stdio")
 
+async def iter_frame_batches(fd=None, bufsize: int = 65536):
+    """
+    Yield lists of newline-framed messages (bytearrays) read from a file descriptor.
+    Each list holds every complete frame that arrived with one os.read() call.
+    The blocking reads happen on a daemon thread, which (unlike
+    connect_read_pipe) also works when stdin is a regular file; reading the
+    raw fd takes no BufferedReader lock, so it never blocks shutdown.
+    """
+    fd = sys.stdin.fileno() if fd is None else fd
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    def pump():
+        chunk = b"-"
+        while chunk:
+            try:
+                chunk = os.read(fd, bufsize)
+            except OSError:
+                chunk = b""
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except RuntimeError:
+                # loop already closed
+                return
+
+    threading.Thread(target=pump, name="stdio-reader", daemon=True).start()
+
+    buf = bytearray()
+    while True:
+        chunk = await chunks.get()
+        if not chunk:
+            # EOF: a last frame may lack its newline
+            if buf and not buf.isspace():
+                yield [buf]
+            return
+        buf += chunk
+        end = buf.rfind(b"\n")
+        if end < 0:
+            continue
+        # frames stay bytearrays (orjson parses them as-is), so a large
+        # tools/call payload is copied once by the split, not again
+        frames = [frame for frame in buf[:end].split(b"\n")
+                  if frame and not frame.isspace()]
+        del buf[:end + 1]
+        if frames:
+            yield frames
+
+class ResponseWriter:
+    """
+    Writes JSON-RPC messages to stdout from the event loop thread.
+    Responses finishing in the same loop iteration are queued and go out
+    together as one write and one flush.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout.buffer
+        self._lines: list = []
+
+    def write(self, message) -> None:
+        self.write_line(orjson.dumps(message) + b"\n")
+
+    def write_line(self, line: bytes) -> None:
+        """Queue an already-encoded message, newline included"""
+        if not self._lines:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._lines.append(line)
+
+    def _flush(self) -> None:
+        if not self._lines:
+            return
+        lines, self._lines = self._lines, []
+        self.stream.write(lines[0] if len(lines) == 1 else b"".join(lines))
+        self.stream.flush()
+
+# error envelopes are static except for "data" (the exception text)
+_PARSE_ERR = b'{"jsonrpc":"2.0","error":{"code":-32700,"message":"Parse error","data":%b},"id":null}\n'
+_INTERNAL_ERR = b'{"jsonrpc":"2.0","error":{"code":-32603,"message":"Internal error","data":%b},"id":null}\n'
+
+async def handle_frame(jsonrpc_server, writer, logger, line: bytearray) -> None:
+    """Parse, dispatch and answer one request"""
+    logger.info("Received request: %r...", bytes(line[:100]))
+    try:
+        # Parse the JSON-RPC request
+        request = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Invalid JSON received: {e}")
+        writer.write_line(_PARSE_ERR % orjson.dumps(str(e)))
+        return
+
+    try:
+        # Handlers block on the shell / disk, so they run on worker
+        # threads and other requests (and batch items) proceed meanwhile
+        response = await jsonrpc_server.dispatch_async(request)
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+        writer.write_line(_INTERNAL_ERR % orjson.dumps(str(e)))
+        return
+
+    # Notifications (valid requests with no "id"), or a batch of only
+    # notifications, never get a response
+    if response is None or is_notification(request):
+        return
+
+    # Responses may go out of order; clients match them by id
+    writer.write(response)
+    logger.info("Response sent")
+
+async def serve(jsonrpc_server, logger) -> None:
+    """Read requests until EOF, handling them concurrently"""
+    writer = ResponseWriter()
+    tasks = set()
+    async for frames in iter_frame_batches():
+        for line in frames:
+            task = asyncio.create_task(handle_frame(jsonrpc_server, writer, logger, line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    # answer everything already received before exiting
+    if tasks:
+        await asyncio.gather(*tasks)
+    writer._flush()
+
 def main():
     """Main STDIO server loop"""
     logger = setup_stdio_logging()
     logger.info("Starting MCP server with STDIO transport")
+    install_event_loop_policy()
 
     # Initialize JSON-RPC server
     jsonrpc_server = JSONRPCServer()
 
-    # Register MCP methods
-    jsonrpc_server.register_method("tools/list", mcp_list_tools)
-    jsonrpc_server.register_method("tools/call", mcp_call_tool)
-    jsonrpc_server.register_method("prompts/list", mcp_list_prompts)
-    jsonrpc_server.register_method("prompts/get", mcp_get_prompt)
-    jsonrpc_server.register_method("resources/list", mcp_list_resources)
-    jsonrpc_server.register_method("resources/read", mcp_read_resource)
-    jsonrpc_server.register_method("roots/list", mcp_list_roots)
+    # Register MCP methods (tools, prompts, resources, roots)
+    shell = pexpect.spawn('/bin/bash', encoding='utf-8', echo=False)
+    mcp = MCPServer(shell)
+    mcp.register_methods(jsonrpc_server)
 
     logger.info("MCP methods registered successfully")
 
     try:
-        while True:
-            # Read a line from stdin
-            line = sys.stdin.readline()
-            if not line:
-                # EOF reached
-                break
-
-            line = line.strip()
-            if not line:
-                continue
-
-            logger.info(f"Received request: {line[:100]}...")
-
-            try:
-                # Parse the JSON-RPC request
-                request = json.loads(line)
-
-                # Handle the request
-                response = jsonrpc_server.handle_request()
-
-                # Send the response to stdout
-                response_json = json.dumps(response, separators=(',', ':'))
-                print(response_json, flush=True)
-                logger.info("Response sent")
-
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON received: {e}")
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32700,
-                        "message": "Parse error",
-                        "data": str(e)
-                    },
-                    "id": None
-                }
-                print(json.dumps(error_response), flush=True)
-
-            except Exception as e:
-                logger.error(f"Unexpected error: {e}")
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32603,
-                        "message": "Internal error",
-                        "data": str(e)
-                    },
-                    "id": None
-                }
-                print(json.dumps(error_response), flush=True)
-
+        asyncio.run(serve(jsonrpc_server, logger))
     except KeyboardInterrupt:
         logger.info("Server shutdown requested")
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         sys.exit(1)
+    finally:
+        mcp.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
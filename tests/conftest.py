@@ -12,9 +12,12 @@ def mocker():
     from pytest_mock import MockerFixture
     return MockerFixture()
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def app():
-    """Create and configure a test app instance."""
+    """
+    Create and configure the test app once per test session: each app
+    spawns a bash shell and an MCP event loop thread.
+    """
     from flask import Flask
     from config import config
     import pexpect
@@ -25,6 +28,10 @@ def app():
     test_app.config['TESTING'] = True
     test_app.config['JWT_SECRET'] = "test_secret"
 
+    # Same JSON provider as the real app: orjson both ways
+    from tools.json_provider import install_json_provider
+    install_json_provider(test_app)
+
     # Initialize OAuth
     from tools.auth import init_oauth_app
     test_app = init_oauth_app(test_app)
@@ -44,7 +51,24 @@ def app():
     from api.routes import bp as api_bp
     test_app.register_blueprint(api_bp)
 
-    return test_app
+    yield test_app
+
+    test_app.mcp.close()
+    shell.close(force=True)
+
+
+@pytest.fixture
+def factory_app():
+    """
+    An app from server_new.create_app; its bash shell and MCP event loop
+    thread are torn down after the test.
+    """
+    from server_new import create_app
+    created = create_app()
+    yield created
+    created.mcp.close()
+    created.mcp._loop_thread.join(timeout=5)
+    created.mcp.shell.close(force=True)
 
 
 @pytest.fixture
@@ -53,14 +77,18 @@ def client(app):
     return app.test_client()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def auth_token():
-    """Get an authentication token for tests."""
+    """
+    Get an authentication token for tests. Tests never change it, so one
+    token is minted per session; tests that rekey tools.auth.auth must
+    restore the key afterwards.
+    """
     from tools.auth import auth
     return auth.create("test_user")
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def auth_headers(auth_token):
     """Get authentication headers for tests."""
     return {'Authorization': f'Bearer {auth_token}'}
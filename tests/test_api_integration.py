@@ -1,5 +1,4 @@
 import pytest
-import json
 
 
 class TestAPIIntegration:
@@ -11,7 +10,7 @@ class TestAPIIntegration:
         response = client.get('/health')
         assert response.status_code == 200
 
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['status'] == 'ok'
 
     def test_chat_endpoint_unauthenticated(self, app):
@@ -20,6 +19,17 @@ class TestAPIIntegration:
         response = client.post('/chat', json={'message': 'Hello'})
         assert response.status_code == 200  # Auth disabled for demo
 
+    def test_mcp_list_tools_endpoint(self, app):
+        """Test the list_tools endpoint returns the tool schemas"""
+        client = app.test_client()
+        response = client.post('/mcp/list_tools')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+
+        data = response.get_json()
+        names = [tool['name'] for tool in data['tools']]
+        assert 'write_to_terminal' in names
+
     def test_mcp_headers(self):
         """Test MCP-specific headers are present"""
         response = self.client.get('/health')
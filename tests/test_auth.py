@@ -0,0 +1,219 @@
+import jwt
+import pytest
+
+import tools.auth
+from tools.auth import JWTAuth, auth
+
+
+@pytest.fixture
+def restore_secret():
+    """Put the shared singleton's key back after a test changes it"""
+    secret = auth.secret
+    yield
+    auth.set_secret(secret)
+
+
+class TestJWTAuth:
+    """Test JWT creation and verification"""
+
+    def test_round_trip(self):
+        """Test a created token verifies and carries its subject"""
+        jwt_auth = JWTAuth(secret="s1")
+        claims = jwt_auth.verify(jwt_auth.create("alice"))
+        assert claims["sub"] == "alice"
+
+    def test_set_secret_rejects_old_tokens(self):
+        """Test tokens signed with the previous key stop verifying"""
+        jwt_auth = JWTAuth(secret="s1")
+        token = jwt_auth.create("alice")
+        jwt_auth.set_secret("s2")
+        with pytest.raises(jwt.InvalidSignatureError):
+            jwt_auth.verify(token)
+        assert jwt_auth.verify(jwt_auth.create("alice"))["sub"] == "alice"
+
+    @pytest.mark.parametrize("claim", ["exp", "iat", "iss", "aud", "sub"])
+    def test_missing_claim_rejected(self, claim):
+        """Test a correctly signed token lacking a standard claim is refused"""
+        jwt_auth = JWTAuth(secret="s1")
+        payload = jwt.decode(jwt_auth.create("alice"), options={"verify_signature": False})
+        del payload[claim]
+        token = jwt.encode(payload, "s1", algorithm="HS256")
+        for verify in (jwt_auth.verify, jwt_auth.verify_cached):
+            with pytest.raises(jwt.MissingRequiredClaimError):
+                verify(token)
+
+    def test_other_algorithm_rejected(self):
+        """Test a token signed with another algorithm is refused"""
+        jwt_auth = JWTAuth(secret="s1")
+        payload = jwt.decode(jwt_auth.create("alice"), options={"verify_signature": False})
+        with pytest.raises(jwt.InvalidAlgorithmError):
+            jwt_auth.verify(jwt.encode(payload, "s1", algorithm="HS512"))
+
+    def test_app_factory_keeps_singleton(self, restore_secret, factory_app):
+        """Test create_app rekeys the shared instance instead of replacing it"""
+        assert tools.auth.auth is auth
+        assert auth.secret == factory_app.config["JWT_SECRET"]
+
+
+class TestVerifiedCache:
+    """Test verify_cached skips decoding repeat tokens, and when it must not"""
+
+    @pytest.fixture
+    def decodes(self, monkeypatch):
+        """Count calls into PyJWT's decode"""
+        calls = []
+        real_decode = jwt.decode
+
+        def counting_decode(*args, **kwargs):
+            calls.append(args[0])
+            return real_decode(*args, **kwargs)
+
+        monkeypatch.setattr("tools.auth.jwt.decode", counting_decode)
+        return calls
+
+    def test_repeat_token_not_decoded(self, decodes):
+        """Test a token is decoded once, then answered from the cache"""
+        jwt_auth = JWTAuth(secret="s1")
+        token = jwt_auth.create("alice")
+        first = jwt_auth.verify_cached(token)
+        second = jwt_auth.verify_cached(token)
+        assert first == second and first["sub"] == "alice"
+        assert len(decodes) == 1
+
+        # callers get copies; mutating one never reaches the cache
+        second["sub"] = "mallory"
+        assert jwt_auth.verify_cached(token)["sub"] == "alice"
+
+    def test_set_secret_invalidates(self, decodes):
+        """Test a cached token is re-checked, and rejected, after a key change"""
+        jwt_auth = JWTAuth(secret="s1")
+        token = jwt_auth.create("alice")
+        jwt_auth.verify_cached(token)
+        jwt_auth.set_secret("s2")
+        with pytest.raises(jwt.InvalidSignatureError):
+            jwt_auth.verify_cached(token)
+
+    def test_expired_token_rejected(self, monkeypatch):
+        """Test a cached token stops verifying once it expires"""
+        import time
+        jwt_auth = JWTAuth(secret="s1")
+        token = jwt_auth.create("alice", ttl_seconds=-10)
+        now = time.time()
+
+        # cache it as if verified while still valid
+        real_decode = jwt.decode
+        monkeypatch.setattr("tools.auth.jwt.decode",
+                            lambda *a, **kw: {"sub": "alice", "exp": int(now) + 60})
+        jwt_auth.verify_cached(token)
+        monkeypatch.setattr("tools.auth.jwt.decode", real_decode)
+        assert jwt_auth.verify_cached(token)["sub"] == "alice"
+
+        monkeypatch.setattr("tools.auth.time.time", lambda: now + 120)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            jwt_auth.verify_cached(token)
+        assert token not in jwt_auth._verified
+
+    def test_invalid_token_not_cached(self):
+        """Test tokens that fail verification are never remembered"""
+        jwt_auth = JWTAuth(secret="s1")
+        forged = JWTAuth(secret="other").create("alice")
+        for _ in range(2):
+            with pytest.raises(jwt.InvalidSignatureError):
+                jwt_auth.verify_cached(forged)
+        assert jwt_auth._verified == {}
+
+    def test_cache_bounded(self, monkeypatch):
+        """Test the cache drops its oldest token once full"""
+        monkeypatch.setattr("tools.auth.VERIFIED_CACHE_SIZE", 3)
+        jwt_auth = JWTAuth(secret="s1")
+        tokens = [jwt_auth.create(f"user{n}") for n in range(4)]
+        for token in tokens:
+            jwt_auth.verify_cached(token)
+        assert list(jwt_auth._verified) == tokens[1:]
+
+
+class TestAccessTokens:
+    """Test the in-memory OAuth access tokens"""
+
+    def test_generate_and_validate(self):
+        """Test a fresh token validates and carries its client"""
+        token = tools.auth.generate_token("mcp_client")
+        assert tools.auth.validate_token(token)["client_id"] == "mcp_client"
+        assert tools.auth.validate_token("no-such-token") is None
+
+    def test_expired_tokens_evicted(self, monkeypatch):
+        """Test issuing a token evicts the ones that have expired"""
+        import time
+        now = time.time()
+        monkeypatch.setattr("tools.auth.time.time", lambda: now)
+        old = tools.auth.generate_token("mcp_client")
+
+        monkeypatch.setattr("tools.auth.time.time", lambda: now + 3601)
+        assert tools.auth.validate_token(old) is None
+        new = tools.auth.generate_token("mcp_client")
+        assert old not in tools.auth.TOKENS
+        assert tools.auth.validate_token(new) is not None
+
+    def test_bounded(self, monkeypatch):
+        """Test issuing past MAX_TOKENS drops the oldest tokens first"""
+        monkeypatch.setattr("tools.auth.TOKENS", {})
+        monkeypatch.setattr("tools.auth._EXPIRY_HEAP", [])
+        monkeypatch.setattr("tools.auth.MAX_TOKENS", 2)
+        tokens = [tools.auth.generate_token("mcp_client") for _ in range(3)]
+        assert tokens[0] not in tools.auth.TOKENS
+        assert all(tools.auth.validate_token(token) for token in tokens[1:])
+        assert len(tools.auth.TOKENS) == 2
+
+    def test_revoke(self, app):
+        """Test a token revokes itself once, then stops authenticating"""
+        client = app.test_client()
+        token = client.post("/oauth/token", data={
+            "grant_type": "client_credentials",
+            "client_id": "mcp_client",
+            "client_secret": "mcp_secret",
+        }).get_json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        r = client.post("/oauth/revoke", headers=headers)
+        assert r.status_code == 200
+        assert token not in tools.auth.TOKENS
+        assert client.post("/oauth/revoke", headers=headers).status_code == 401
+
+
+class TestRejections:
+    """Test the prebuilt 401 bodies rejected requests get"""
+
+    def test_require_auth(self, app):
+        """Test a missing or unknown OAuth token is rejected with its error body"""
+        client = app.test_client()
+        r = client.post("/oauth/revoke")
+        assert r.status_code == 401
+        assert r.mimetype == "application/json"
+        assert r.get_json()["error"] == "invalid_request"
+
+        r = client.post("/oauth/revoke", headers={"Authorization": "Bearer nope"})
+        assert r.status_code == 401
+        assert r.get_json() == {"error": "invalid_token",
+                                "error_description": "Invalid or expired token"}
+
+    def test_require_token(self):
+        """Test a missing, expired or forged JWT gets its own error"""
+        from flask import Flask
+        jwt_app = Flask(__name__)
+
+        @jwt_app.route("/guarded")
+        @tools.auth.require_token()
+        def guarded():
+            return {"sub": tools.auth.request.jwt_claims["sub"]}
+
+        client = jwt_app.test_client()
+        expired = auth.create("alice", ttl_seconds=-10)
+        forged = JWTAuth(secret="other").create("alice")
+        for headers, error in [({}, "missing_bearer_token"),
+                               ({"Authorization": f"Bearer {expired}"}, "token_expired"),
+                               ({"Authorization": f"Bearer {forged}"}, "invalid_token")]:
+            r = client.get("/guarded", headers=headers)
+            assert (r.status_code, r.get_json()) == (401, {"error": error})
+
+        r = client.get("/guarded", headers={"Authorization": f"Bearer {auth.create('alice')}"})
+        assert r.get_json() == {"sub": "alice"}
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from mcp_server import MCPServer
+from models.conversation_store import ConversationStore
+from models.event_bus import EventBus
+
+
+@pytest.fixture
+def chat_server():
+    """MCP server with its own store and bus; no shell is needed for chat"""
+    bus = EventBus()
+    server = MCPServer(None, event_bus=bus, conversation_store=ConversationStore(event_bus=bus))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def reply(monkeypatch):
+    """Stub DeepSeek: streams the text assigned to reply.text, recording uploads"""
+    class Reply:
+        text = "Hi there"
+        sent = []
+
+    def fake_stream(messages):
+        Reply.sent.append(messages)
+        # split mid-line to exercise the incremental CMD: scanning
+        text = Reply.text
+        for i in range(0, len(text), 3):
+            yield text[i:i + 3]
+
+    monkeypatch.setattr("tools.deepseek_client.stream", fake_stream)
+    Reply.sent = []
+    return Reply
+
+
+class TestChatSessions:
+    """Test which history a chat turn reads and extends"""
+
+    def test_new_session_issued(self, chat_server, reply):
+        """Test a turn without a session id gets a fresh, live session"""
+        resp = chat_server.handle_chat({"message": "Hello"})
+        assert resp["message"] == "Hi there"
+        assert chat_server.conversation_store.get_session(resp["session_id"]) is not None
+
+    def test_history_kept_per_session(self, chat_server, reply):
+        """Test a returned session id continues its own conversation only"""
+        first = chat_server.handle_chat({"message": "one"})["session_id"]
+        assert chat_server.handle_chat({"message": "two", "session_id": first})["session_id"] == first
+        other = chat_server.handle_chat({"message": "three"})["session_id"]
+        assert other != first
+
+        contents = [m["content"] for m in reply.sent[1]]
+        assert contents[1:] == ["one", "Hi there", "two"]
+        contents = [m["content"] for m in reply.sent[2]]
+        assert contents[1:] == ["three"]
+
+    def test_unknown_session_not_stored(self, chat_server, reply):
+        """Test ids the store did not issue are replaced, not given a history"""
+        for requested in ("made_up_session_id", "bad id!", 42):
+            resp = chat_server.handle_chat({"message": "Hello", "session_id": requested})
+            assert resp["session_id"] != requested
+
+        store = chat_server.conversation_store
+        assert "made_up_session_id" not in store.get_all_sessions()
+        assert store.get_conversation("made_up_session_id") == [store._system_msg]
+
+
+@pytest.fixture
+def commands(chat_server):
+    """Stub the command runner: echoes each command, recording what ran"""
+    ran = []
+
+    async def fake_run(cmd, session_id):
+        ran.append(cmd)
+        if cmd.startswith("sleep"):
+            await asyncio.sleep(float(cmd.split()[1]))
+        if cmd == "fail":
+            raise RuntimeError("boom")
+        return f"out:{cmd}"
+
+    chat_server._run_chat_command = fake_run
+    return ran
+
+
+class TestChatReplies:
+    """Test streaming a reply and splicing in its CMD: output"""
+
+    def test_tokens_published(self, chat_server, reply, commands):
+        """Test each streamed chunk reaches the session's event queue"""
+        reply.text = "Plain answer, no commands"
+        session_id = chat_server.handle_chat({"message": "first"})["session_id"]
+        q = chat_server.event_bus.subscribe(session_id)
+        resp = chat_server.handle_chat({"message": "hi", "session_id": session_id})
+        assert resp["message"] == reply.text
+        assert commands == []
+
+        texts = []
+        while not q.empty():
+            event = q.get_nowait()
+            assert event["type"] == "token"
+            texts.append(event["text"])
+        assert "".join(texts) == reply.text
+
+    def test_unstreamed_chats_leave_no_queues(self, chat_server, reply):
+        """Test chats nobody streams, and sessions that end, hold no event queues"""
+        for _ in range(20):
+            chat_server.handle_chat({"message": "hi"})
+        assert chat_server.event_bus.queues == {}
+
+        store = chat_server.conversation_store
+        session_id = chat_server.handle_chat({"message": "hi"})["session_id"]
+        chat_server.event_bus.subscribe(session_id)
+        store.end_session(session_id)
+        assert chat_server.event_bus.queues == {}
+
+    def test_command_output_spliced(self, chat_server, reply, commands):
+        """Test every CMD: line is replaced by its command's output, in order"""
+        reply.text = "Let me look.\nCMD: ls -la\nand\n  CMD: pwd\nDone"
+        resp = chat_server.handle_chat({"message": "hi"})
+        assert commands == ["ls -la", "pwd"]
+        assert resp["message"] == (
+            "Let me look.\n(Ran: ls -la)\nout:ls -la\nand\n(Ran: pwd)\nout:pwd\nDone")
+
+    def test_empty_and_inline_cmd(self, chat_server, reply, commands):
+        """Test an empty CMD: is reported and a mid-line CMD: is left alone"""
+        reply.text = "CMD:\nUse the CMD: prefix\nCMD:   \nCMD: whoami"
+        resp = chat_server.handle_chat({"message": "hi"})
+        assert commands == ["whoami"]
+        assert resp["message"] == (
+            "(No command specified.)\nUse the CMD: prefix\n(No command specified.)\n"
+            "(Ran: whoami)\nout:whoami")
+
+    def test_command_error(self, chat_server, reply, commands):
+        """Test a failing command is reported in place of its output"""
+        reply.text = "CMD: fail\nCMD: echo ok"
+        resp = chat_server.handle_chat({"message": "hi"})
+        assert resp["message"] == "(Error running 'fail': boom)\n(Ran: echo ok)\nout:echo ok"
+
+    def test_shared_deadline(self, chat_server, reply, commands, monkeypatch):
+        """Test commands still running at the turn's deadline are reported as timed out"""
+        monkeypatch.setattr("mcp_server.COMMAND_TIMEOUT", 0.2)
+        reply.text = "CMD: sleep 5\nCMD: echo ok"
+        resp = chat_server.handle_chat({"message": "hi"})
+        assert resp["message"] == (
+            "(Error running 'sleep 5': timed out after 0.2s)\n(Ran: echo ok)\nout:echo ok")
+
+    def test_reply_stored(self, chat_server, reply, commands):
+        """Test the stored assistant message is the spliced reply"""
+        reply.text = "CMD: pwd"
+        resp = chat_server.handle_chat({"message": "where am I"})
+        history = chat_server.conversation_store.get_conversation(resp["session_id"])
+        assert [(m["role"], m["content"]) for m in history[1:]] == [
+            ("user", "where am I"), ("assistant", "(Ran: pwd)\nout:pwd")]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pexpect
+import pytest
+
+from tools.command_executor import CommandExecutor, QUIET_PERIOD
+from tools.tty_output_reader import TtyOutputReader
+
+
+@pytest.fixture(scope="module")
+def shell():
+    """A bash session of our own, so prompt markers don't leak into other tests"""
+    shell = pexpect.spawn('/bin/bash', encoding='utf-8', echo=False)
+    yield shell
+    shell.close(force=True)
+
+
+def _run(shell, command):
+    start = time.monotonic()
+    asyncio.run(CommandExecutor(shell).execute_command(command))
+    return time.monotonic() - start
+
+
+class TestCommandExecutor:
+    """Test commands end when their prompt returns, not after a fixed wait"""
+
+    def test_output_without_marker(self, shell):
+        """Test output lands in the buffer and the prompt marker never does"""
+        _run(shell, "true")  # installs the marker
+        before = TtyOutputReader.get_buffer_newline_count()
+        _run(shell, "echo one; echo two")
+
+        buffer = TtyOutputReader.get_buffer()
+        assert "one\ntwo\n" in buffer
+        assert "1337;" not in buffer
+        assert TtyOutputReader.get_buffer_newline_count() - before >= 2
+
+    def test_fast_command_returns_at_prompt(self, shell):
+        """Test a quick command does not wait out the quiet period"""
+        _run(shell, "true")
+        assert _run(shell, "echo fast") < QUIET_PERIOD
+
+    def test_slow_command_waits_for_output(self, shell):
+        """Test steady output keeps the wait going until the prompt returns"""
+        _run(shell, "true")
+        _run(shell, "for i in 1 2 3; do echo tick$i; sleep 0.2; done")
+        assert "tick3" in TtyOutputReader.get_buffer()
+
+    def test_interactive_program_goes_quiet(self, shell):
+        """Test a program that keeps the terminal is left once output pauses"""
+        _run(shell, "true")
+        elapsed = _run(shell, "cat")
+        assert QUIET_PERIOD <= elapsed < 5
+        shell.sendcontrol("d")
+        _run(shell, "true")
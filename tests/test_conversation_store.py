@@ -0,0 +1,174 @@
+import threading
+import types
+
+import pytest
+
+from config import config
+from models.conversation_store import ConversationStore, MAX_HISTORY
+from models.event_bus import EventBus
+
+
+class TestUserIndex:
+    """Test the per-user session index"""
+
+    def test_get_user_sessions(self):
+        """Test sessions are listed under their own user only"""
+        store = ConversationStore()
+        a1 = store.create_session("alice")
+        a2 = store.create_session("alice")
+        b1 = store.create_session("bob")
+
+        assert {s.session_id for s in store.get_user_sessions("alice")} == {a1.session_id, a2.session_id}
+        assert [s.session_id for s in store.get_user_sessions("bob")] == [b1.session_id]
+        assert store.get_user_sessions("carol") == []
+
+    def test_get_user_sessions_after_end_session(self):
+        """Test an ended session leaves the user's list and its history goes"""
+        store = ConversationStore()
+        a1 = store.create_session("alice")
+        a2 = store.create_session("alice")
+        store.add_message(a1.session_id, "user", "hi")
+
+        store.end_session(a1.session_id)
+        assert [s.session_id for s in store.get_user_sessions("alice")] == [a2.session_id]
+        assert a1.session_id not in store.get_all_sessions()
+
+        store.end_session(a2.session_id)
+        assert store.get_user_sessions("alice") == []
+        assert "alice" not in store._user_index
+
+
+class TestHistory:
+    """Test the bounded per-session message history"""
+
+    def test_oldest_message_dropped(self):
+        """Test history keeps only the newest MAX_HISTORY messages"""
+        store = ConversationStore()
+        sid = store.create_session("alice").session_id
+        for i in range(MAX_HISTORY + 5):
+            store.add_message(sid, "user", str(i))
+
+        conversation = store.get_conversation(sid)
+        assert conversation[0]["role"] == "system"
+        assert [m["content"] for m in conversation[1:]] == [str(i) for i in range(5, MAX_HISTORY + 5)]
+
+    def test_recent_conversation(self):
+        """Test only the last messages follow the system prompt"""
+        store = ConversationStore()
+        sid = store.create_session("alice").session_id
+        for i in range(10):
+            store.add_message(sid, "user", str(i))
+
+        recent = store.get_recent_conversation(sid, 3)
+        assert recent[0] is store._system_msg
+        assert [m["content"] for m in recent[1:]] == ["7", "8", "9"]
+        assert len(store.get_recent_conversation(sid, 50)) == 11
+
+    def test_clear_conversation(self):
+        """Test clearing empties the history but keeps the system prompt"""
+        store = ConversationStore()
+        sid = store.create_session("alice").session_id
+        store.add_message(sid, "user", "hi")
+        store.clear_conversation(sid)
+        assert store.get_conversation(sid) == [store._system_msg]
+
+
+class TestConcurrency:
+    """Test the striped locks under concurrent use"""
+
+    def test_parallel_sessions(self):
+        """Test threads creating and writing sessions lose no messages"""
+        store = ConversationStore()
+        results = {}
+
+        def worker(n):
+            sid = store.create_session(f"user{n % 4}").session_id
+            for i in range(50):
+                store.add_message(sid, "user", str(i))
+            results[n] = sid
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(results.values())) == 16
+        for sid in results.values():
+            assert len(store.get_conversation(sid)) == 51
+        assert sum(len(store.get_user_sessions(f"user{u}")) for u in range(4)) == 16
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for the store's expiry checks"""
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    monkeypatch.setattr("models.conversation_store.time", fake)
+    return fake
+
+
+class TestExpiry:
+    """Test session expiry through the lazy expiry heap"""
+
+    def test_expired_sessions_swept(self, clock):
+        """Test cleanup removes sessions idle past SESSION_TIMEOUT only"""
+        store = ConversationStore()
+        old = store.create_session("alice").session_id
+        store.add_message(old, "user", "hi")
+        clock.now += config.SESSION_TIMEOUT / 2
+        new = store.create_session("alice").session_id
+
+        clock.now += config.SESSION_TIMEOUT / 2 + 1
+        assert store.cleanup_expired_sessions() == 1
+        assert old not in store.get_all_sessions()
+        assert [s.session_id for s in store.get_user_sessions("alice")] == [new]
+        assert store.get_session(old) is None
+
+    def test_active_session_rescheduled(self, clock):
+        """Test a session used since it was scheduled survives and expires later"""
+        store = ConversationStore()
+        sid = store.create_session("alice").session_id
+        clock.now += config.SESSION_TIMEOUT - 10
+        assert store.get_session(sid) is not None
+
+        clock.now += 20
+        # its first deadline is due, but it was used since: pushed back
+        assert store.cleanup_expired_sessions() == 0
+        assert store.get_session(sid) is not None
+
+        clock.now += config.SESSION_TIMEOUT + 1
+        assert store.cleanup_expired_sessions() == 1
+        assert store.get_session(sid) is None
+
+    def test_expiry_closes_event_queue(self, clock):
+        """Test an expired session's stream queue is dropped from the bus"""
+        bus = EventBus()
+        store = ConversationStore(event_bus=bus)
+        sid = store.create_session("alice").session_id
+        bus.subscribe(sid)
+
+        clock.now += config.SESSION_TIMEOUT + 1
+        assert store.cleanup_expired_sessions() == 1
+        assert bus.queues == {}
+
+    def test_sweep_limit(self, clock):
+        """Test one cleanup call reclaims at most ``limit`` sessions"""
+        store = ConversationStore()
+        for n in range(5):
+            store.create_session(f"user{n}")
+        clock.now += config.SESSION_TIMEOUT + 1
+
+        assert store.cleanup_expired_sessions(limit=2) == 2
+        assert store.cleanup_expired_sessions(limit=10) == 3
+        assert store.get_session_stats()["total_sessions"] == 0
+
+    def test_create_session_sweeps(self, clock):
+        """Test creating a session reclaims expired ones on the way"""
+        store = ConversationStore()
+        old = store.create_session("alice").session_id
+        clock.now += config.SESSION_TIMEOUT + 1
+        store.create_session("bob")
+        assert store.get_user_sessions("alice") == []
+        assert store.get_session_stats()["total_sessions"] == 1
+        assert old not in store._sessions
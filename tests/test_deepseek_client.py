@@ -0,0 +1,90 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from tools import deepseek_client
+from tools.deepseek_client import DeepseekError
+
+
+class FakeResponse:
+    """Just enough of requests.Response for the client"""
+
+    def __init__(self, content: bytes, status_code: int = 200, pieces=(), chunked=True):
+        self.content = content
+        self.text = content.decode()
+        self.status_code = status_code
+        self.raw = SimpleNamespace(chunked=chunked)
+        self._pieces = pieces
+        self.read_size = None
+
+    def iter_content(self, chunk_size):
+        self.read_size = chunk_size
+        return iter(self._pieces)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def respond(monkeypatch):
+    """Answer every DeepSeek POST with the FakeResponse assigned to respond.with_"""
+    class Respond:
+        with_ = None
+
+    monkeypatch.setattr(deepseek_client, "DEEPSEEK_KEY", "test-key")
+    monkeypatch.setattr(deepseek_client.session, "post", lambda *a, **kw: Respond.with_)
+    return Respond
+
+
+class TestChat:
+    """Test decoding of non-streamed completions"""
+
+    def test_content_returned(self, respond):
+        """Test the reply text is pulled out of the JSON body"""
+        respond.with_ = FakeResponse('{"choices":[{"message":{"content":"héllo"}}]}'.encode())
+        assert deepseek_client.chat([]) == "héllo"
+
+    def test_unexpected_shape(self, respond):
+        """Test a body without choices is reported with its content"""
+        respond.with_ = FakeResponse(b'{"error":"nope"}')
+        with pytest.raises(DeepseekError, match=re.escape('unexpected response: {"error":"nope"}')):
+            deepseek_client.chat([])
+
+
+class TestStream:
+    """Test SSE lines are decoded straight from bytes"""
+
+    def test_deltas(self, respond):
+        """Test deltas are yielded in order, skipping keepalives and stopping at [DONE]"""
+        respond.with_ = FakeResponse(b"", pieces=[b"\n\n".join([
+            b'data: {"choices":[{"delta":{"content":"Hi"}}]}',
+            b": keepalive",
+            b"data: {broken",
+            b'data: {"choices":[{"delta":{}}]}',
+            b'data: {"choices":[{"delta":{"content":" there"}}]}',
+            b"data: [DONE]",
+            b'data: {"choices":[{"delta":{"content":"late"}}]}',
+        ])])
+        assert list(deepseek_client.stream([])) == ["Hi", " there"]
+
+    @pytest.mark.parametrize("cut", [1, 7, 20, 45, 46, 60])
+    def test_line_split_across_reads(self, respond, cut):
+        """Test an event cut anywhere, CRLF endings and no final newline"""
+        body = (b'data: {"choices":[{"delta":{"content":"a"}}]}\r\n\r\n'
+                b'data: {"choices":[{"delta":{"content":"b"}}]}')
+        respond.with_ = FakeResponse(b"", pieces=[body[:cut], body[cut:]])
+        assert list(deepseek_client.stream([])) == ["a", "b"]
+
+    def test_read_size(self, respond):
+        """Test large reads are used only where they cannot delay deltas"""
+        respond.with_ = FakeResponse(b"", chunked=True)
+        list(deepseek_client.stream([]))
+        assert respond.with_.read_size == deepseek_client.SSE_READ_SIZE
+
+        respond.with_ = FakeResponse(b"", chunked=False)
+        list(deepseek_client.stream([]))
+        assert respond.with_.read_size == 512
@@ -0,0 +1,96 @@
+import pytest
+
+from flask import Flask
+from werkzeug.exceptions import BadRequest, MethodNotAllowed, NotFound, Unauthorized
+
+from tools.error_handler import ErrorHandler, ErrorRecovery, ValidationError
+
+
+def _raised(error):
+    """Return error after raising it, so it carries a traceback"""
+    try:
+        raise error
+    except Exception as e:
+        return e
+
+
+class TestErrorLogging:
+    """Test errors are logged with their traceback, formatted only on output"""
+
+    def test_traceback_attached(self, caplog):
+        """Test the record carries the error's own traceback, even outside except"""
+        error = _raised(RuntimeError("boom"))
+        with caplog.at_level("ERROR", logger="error_handler"):
+            ErrorHandler.handle_async_error(error, "worker")
+
+        record = caplog.records[-1]
+        assert record.getMessage() == "Async error in worker: boom"
+        assert record.exc_info[1] is error
+        assert "Traceback" in caplog.text
+
+    def test_filtered_out_records_not_formatted(self, monkeypatch, caplog):
+        """Test nothing is rendered when ERROR records are not wanted"""
+        def no_formatting(*args, **kwargs):
+            raise AssertionError("traceback formatted")
+
+        monkeypatch.setattr("traceback.print_exception", no_formatting)
+        monkeypatch.setattr("traceback.format_exception", no_formatting)
+        with caplog.at_level("CRITICAL", logger="error_handler"):
+            ErrorHandler.handle_command_error("ls", _raised(OSError("gone")))
+        assert caplog.records == []
+
+
+class TestHttpErrors:
+    """Test Flask errors map to their fixed JSON bodies"""
+
+    @pytest.mark.parametrize("error, status, title", [
+        (NotFound(), 404, "Not Found"),
+        (MethodNotAllowed(), 405, "Method Not Allowed"),
+        (BadRequest(), 400, "Bad Request"),
+        (Unauthorized(), 500, "Internal Server Error"),
+        (RuntimeError("boom"), 500, "Internal Server Error"),
+    ])
+    def test_status_and_body(self, error, status, title):
+        """Test each error gets its status and body"""
+        with Flask(__name__).app_context():
+            response, returned_status = ErrorHandler.handle_flask_error(error)
+        assert returned_status == response.status_code == status
+        assert response.mimetype == "application/json"
+        assert response.get_json()["error"] == title
+
+    def test_mcp_error(self):
+        """Test MCP errors still report their own class, message and details"""
+        with Flask(__name__).app_context():
+            response, status = ErrorHandler.handle_flask_error(ValidationError("bad", "name"))
+        assert status == 400
+        assert response.get_json() == {"error": "ValidationError", "message": "bad",
+                                       "details": {"field": "name"}}
+
+
+class TestErrorRecovery:
+    """Test retries and their backoff"""
+
+    def test_backoff_delays(self, monkeypatch):
+        """Test failed attempts sleep 0.5, 1, 2, ... seconds, then re-raise"""
+        sleeps = []
+        monkeypatch.setattr("tools.error_handler.time.sleep", sleeps.append)
+
+        def failing():
+            raise RuntimeError("down")
+
+        with pytest.raises(RuntimeError, match="down"):
+            ErrorRecovery.attempt_recovery(failing, 6)
+        assert sleeps == [0.5, 1.0, 2.0, 4.0, 8.0]
+
+    def test_success_after_retry(self, monkeypatch):
+        """Test the first successful result is returned"""
+        monkeypatch.setattr("tools.error_handler.time.sleep", lambda delay: None)
+        results = iter([ValueError("flaky"), "ok"])
+
+        def flaky():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        assert ErrorRecovery.attempt_recovery(flaky) == "ok"
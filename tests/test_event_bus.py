@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from models.event_bus import EventBus, EventQueue
+
+
+class TestEventQueue:
+    """Test the bounded per-session event buffer"""
+
+    def test_fifo(self):
+        """Test events come out in publish order"""
+        q = EventQueue(10)
+        for i in range(3):
+            q.put({"n": i})
+        assert [q.get_nowait()["n"] for _ in range(3)] == [0, 1, 2]
+        assert q.empty()
+
+    def test_drop_oldest_when_full(self):
+        """Test a full queue drops its oldest event instead of blocking"""
+        q = EventQueue(3)
+        for i in range(5):
+            q.put({"n": i})
+        assert [q.get_nowait()["n"] for _ in range(3)] == [2, 3, 4]
+        with pytest.raises(queue.Empty):
+            q.get_nowait()
+
+    def test_get_times_out(self):
+        """Test get() raises queue.Empty when nothing arrives in time"""
+        q = EventQueue(3)
+        start = time.monotonic()
+        with pytest.raises(queue.Empty):
+            q.get(timeout=0.05)
+        assert time.monotonic() - start >= 0.05
+
+    def test_get_wakes_on_put(self):
+        """Test a waiting consumer wakes as soon as an event is put"""
+        q = EventQueue(3)
+        got = []
+        consumer = threading.Thread(target=lambda: got.append(q.get(timeout=5)))
+        consumer.start()
+        time.sleep(0.05)
+        q.put({"n": 1})
+        consumer.join(timeout=1)
+        assert not consumer.is_alive()
+        assert got == [{"n": 1}]
+
+    def test_get_after_drained(self):
+        """Test a consumer that drained the queue waits for the next event"""
+        q = EventQueue(3)
+        q.put({"n": 1})
+        assert q.get(timeout=1) == {"n": 1}
+        threading.Timer(0.05, q.put, args=({"n": 2},)).start()
+        assert q.get(timeout=5) == {"n": 2}
+
+
+class TestEventBus:
+    """Test per-session queues on the bus"""
+
+    def test_publish_by_session(self):
+        """Test events only reach their own session's queue"""
+        bus = EventBus(maxsize=4)
+        a, b = bus.subscribe("a"), bus.subscribe("b")
+        bus.publish("a", {"n": 1})
+        assert a.get_nowait() == {"n": 1}
+        assert b.empty()
+        assert bus.get("a") is a
+
+    def test_publish_without_stream(self):
+        """Test events for a session nobody streams create no queue"""
+        bus = EventBus(maxsize=4)
+        bus.publish("a", {"n": 1})
+        assert bus.queues == {}
+
+        q = bus.subscribe("a")
+        bus.unsubscribe("a", q)
+        bus.publish("a", {"n": 2})
+        assert q.empty()
+        assert bus.queues == {}
+
+    def test_close(self):
+        """Test closing drops the session's queue"""
+        bus = EventBus(maxsize=4)
+        first = bus.get("a")
+        bus.close("a")
+        assert bus.get("a") is not first
+
+    def test_subscribe_capped(self):
+        """Test a session takes at most max_readers streams, freed on unsubscribe"""
+        bus = EventBus(maxsize=4, max_readers=2)
+        first, second = bus.subscribe("a"), bus.subscribe("a")
+        assert first is second is bus.get("a")
+        assert bus.subscribe("a") is None
+        assert bus.subscribe("b") is not None
+
+        bus.unsubscribe("a", first)
+        assert bus.subscribe("a") is first
+
+
+class TestStreamRoute:
+    """Test /stream holds its subscription exactly as long as the response"""
+
+    def test_stream_slots_released(self, app, monkeypatch):
+        """Test streams over the cap get 429 until an open one is closed"""
+        monkeypatch.setattr(app.event_bus, "max_readers", 1)
+        client = app.test_client()
+        url = "/stream?session_id=cap-test"
+
+        first = client.get(url, buffered=False)
+        assert first.status_code == 200
+        assert next(iter(first.response)).startswith(b"event: hello")
+        limited = client.get(url, buffered=False)
+        assert limited.status_code == 429
+        assert limited.get_json() == {"error": "too_many_streams"}
+
+        first.close()
+        # closing before the body is ever read also frees the slot
+        unread = client.get(url, buffered=False)
+        assert unread.status_code == 200
+        unread.close()
+        last = client.get(url, buffered=False)
+        assert last.status_code == 200
+        last.close()
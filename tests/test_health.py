@@ -1,8 +1,5 @@
-from server_new import create_app
-
-def test_health():
-    app = create_app()
-    client = app.test_client()
+def test_health(factory_app):
+    client = factory_app.test_client()
     r = client.get("/health")
     assert r.status_code == 200
     assert r.get_json()["status"] == "ok"
\ No newline at end of file
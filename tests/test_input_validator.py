@@ -25,6 +25,37 @@ class TestInputValidator:
             with pytest.raises(ValueError, match="contains potentially dangerous"):
                 InputValidator.sanitize_command(cmd)
 
+    def test_dangerous_regex_matches_entry_loop(self):
+        """Test the combined regex agrees with checking every entry on its own"""
+        import random
+        import re
+
+        def per_entry(command):
+            lowered = command.lower()
+            return (any(d in lowered for d in InputValidator.DANGEROUS_COMMANDS) or
+                    any(re.search(p, lowered) for p in InputValidator.DANGEROUS_PATTERNS))
+
+        fragments = InputValidator.DANGEROUS_COMMANDS + [
+            "ls", "-la", " ", "/", "*", ".*", "|", ";", "`", "$(", ")", "sh",
+            "bash", "rm", "-rf", ">", "/dev/", "curl x", "wget y", "echo", "SUDO", "\t"]
+        rng = random.Random(1234)
+        for _ in range(5000):
+            command = "".join(rng.choice(fragments) for _ in range(rng.randint(1, 6)))
+            assert InputValidator._is_dangerous_command(command) == per_entry(command), command
+
+    def test_sanitize_command_dangerous_mid_command(self):
+        """Test dangerous operations are caught anywhere, not just as a prefix"""
+        dangerous_commands = [
+            "echo hi && sudo ls",
+            "ls; shutdown -h now",
+            "cd /tmp && rm -rf /",
+            "ls | SUDO tee x"
+        ]
+
+        for cmd in dangerous_commands:
+            with pytest.raises(ValueError, match="contains potentially dangerous"):
+                InputValidator.sanitize_command(cmd)
+
     def test_sanitize_command_length_limit(self):
         """Test command length limits"""
         long_command = "ls " + "a" * 1000
@@ -37,6 +68,20 @@ class TestInputValidator:
         result = InputValidator.validate_message(message)
         assert result == message
 
+    @pytest.mark.parametrize("message, valid", [
+        ("line one\n\tline two\r\nthree", True),
+        ("Привет, как дела?", True),
+        ("bell \x07", False),
+        ("price \u20ac5", False),
+    ])
+    def test_validate_message_characters(self, message, valid):
+        """Test multi-line and non-Latin text pass, control and other symbols do not"""
+        if valid:
+            assert InputValidator.validate_message(message) == message
+        else:
+            with pytest.raises(ValueError, match="invalid characters"):
+                InputValidator.validate_message(message)
+
     def test_validate_message_too_long(self):
         """Test message length limits"""
         long_message = "a" * 10001
@@ -120,4 +165,10 @@ class TestInputValidator:
 
         for path in dangerous_paths:
             with pytest.raises(ValueError):
-                InputValidator.sanitize_file_path(path)
\ No newline at end of file
+                InputValidator.sanitize_file_path(path)
+    @pytest.mark.parametrize("char", list("<>|&;`$()"))
+    def test_sanitize_file_path_forbidden_chars(self, char):
+        """Test every forbidden character is rejected wherever it appears"""
+        for path in (f"{char}file.txt", f"dir/fi{char}le.txt", f"dir/file.txt{char}"):
+            with pytest.raises(ValueError, match="invalid characters"):
+                InputValidator.sanitize_file_path(path)
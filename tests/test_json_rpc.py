@@ -36,14 +36,14 @@ class TestJSONRPCServer:
     def test_handle_request_valid(self, mocker):
         """Test handling valid JSON-RPC requests"""
         # Mock Flask request
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.return_value = {
+        mock_request.get_data.return_value = json.dumps({
             "jsonrpc": "2.0",
             "method": "test.add",
             "params": {"a": 5, "b": 3},
             "id": 1
-        }
+        }).encode()
 
         response = self.server.handle_request()
 
@@ -53,13 +53,13 @@ class TestJSONRPCServer:
 
     def test_handle_request_method_not_found(self, mocker):
         """Test handling unknown method"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.return_value = {
+        mock_request.get_data.return_value = json.dumps({
             "jsonrpc": "2.0",
             "method": "unknown.method",
             "id": 1
-        }
+        }).encode()
 
         response = self.server.handle_request()
 
@@ -70,13 +70,13 @@ class TestJSONRPCServer:
 
     def test_handle_request_invalid_jsonrpc_version(self, mocker):
         """Test handling invalid JSON-RPC version"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.return_value = {
+        mock_request.get_data.return_value = json.dumps({
             "jsonrpc": "1.0",
             "method": "test.add",
             "id": 1
-        }
+        }).encode()
 
         response = self.server.handle_request()
 
@@ -86,12 +86,12 @@ class TestJSONRPCServer:
 
     def test_handle_request_missing_method(self, mocker):
         """Test handling request without method"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.return_value = {
+        mock_request.get_data.return_value = json.dumps({
             "jsonrpc": "2.0",
             "id": 1
-        }
+        }).encode()
 
         response = self.server.handle_request()
 
@@ -101,13 +101,13 @@ class TestJSONRPCServer:
 
     def test_handle_request_with_error_method(self, mocker):
         """Test handling method that raises an error"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.return_value = {
+        mock_request.get_data.return_value = json.dumps({
             "jsonrpc": "2.0",
             "method": "test.error",
             "id": 1
-        }
+        }).encode()
 
         response = self.server.handle_request()
 
@@ -118,7 +118,7 @@ class TestJSONRPCServer:
 
     def test_handle_request_not_json(self, mocker):
         """Test handling non-JSON request"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = False
 
         response = self.server.handle_request()
@@ -129,9 +129,9 @@ class TestJSONRPCServer:
 
     def test_handle_request_json_decode_error(self, mocker):
         """Test handling JSON decode error"""
-        mock_request = mocker.patch('tools.json_rpc.request')
+        mock_request = mocker.patch('tools.json_rpc._request').return_value
         mock_request.is_json = True
-        mock_request.get_json.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
+        mock_request.get_data.return_value = b'{"jsonrpc": "2.0", "method": }'
 
         response = self.server.handle_request()
 
@@ -139,6 +139,124 @@ class TestJSONRPCServer:
         assert response["error"]["code"] == -32700
         assert "Parse error" in response["error"]["message"]
 
+    def _request_context(self, body: bytes):
+        from flask import Flask
+        return Flask(__name__).test_request_context(
+            "/", method="POST", data=body, content_type="application/json")
+
+    def test_handle_request_flask_body(self):
+        """Test a real request body is parsed and dispatched"""
+        with self._request_context(b'{"jsonrpc": "2.0", "method": "test.add", "params": {"a": 2, "b": 3}, "id": 9}\n'):
+            response = self.server.handle_request()
+        assert response["result"] == 5
+        assert response["id"] == 9
+
+    def test_handle_request_truncated_body(self):
+        """Test a body cut off mid-object is a parse error"""
+        with self._request_context(b'{"jsonrpc": "2.0", "method": "test.add", "par'):
+            response = self.server.handle_request()
+        assert response["error"]["code"] == -32700
+
+    @pytest.mark.parametrize("body", [b"1", b'"x"', b"null", b" true\n"])
+    def test_handle_request_scalar_body(self, body):
+        """Test well-formed JSON that is not an object or array is an Invalid Request"""
+        with self._request_context(body):
+            response = self.server.handle_request()
+        assert response == {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid Request"}, "id": None}
+
+    @pytest.mark.parametrize("body", [b"", b"  ", b"tru", b'"x'])
+    def test_handle_request_unparsable_scalar(self, body):
+        """Test a body that is not valid JSON at all is still a parse error"""
+        with self._request_context(body):
+            response = self.server.handle_request()
+        assert response["error"]["code"] == -32700
+
+    def test_dispatch_method_not_found(self):
+        """Test unknown methods get -32601 with their own id each time"""
+        first = self.server.dispatch({"jsonrpc": "2.0", "method": "no.such", "id": 1})
+        second = self.server.dispatch({"jsonrpc": "2.0", "method": "no.such", "id": "b"})
+
+        assert first == {"jsonrpc": "2.0", "error": {"code": -32601, "message": "Method not found"}, "id": 1}
+        assert second["id"] == "b"
+        assert first is not second
+
+    def test_dispatch_batch(self):
+        """Test a batch gets one response per request, notifications skipped"""
+        responses = self.server.dispatch([
+            {"jsonrpc": "2.0", "method": "test.add", "params": {"a": 1, "b": 2}, "id": 1},
+            {"jsonrpc": "2.0", "method": "test.echo", "params": {"message": "quiet"}},
+            {"jsonrpc": "2.0", "method": "no.such", "id": 2},
+            "not a request",
+        ])
+
+        assert [r["id"] for r in responses] == [1, 2, None]
+        assert responses[0]["result"] == 3
+        assert responses[1]["error"]["code"] == -32601
+        assert responses[2]["error"]["code"] == -32600
+
+    @pytest.mark.parametrize("item", [
+        {"foo": "boo"},
+        {"jsonrpc": "1.0", "method": "test.echo"},
+        {"jsonrpc": "2.0", "method": 5},
+    ], ids=["no-envelope", "wrong-version", "non-str-method"])
+    def test_dispatch_batch_invalid_without_id(self, item):
+        """Test an invalid item lacking an id is answered, not taken for a notification"""
+        assert self.server.dispatch([item]) == [
+            {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid Request"}, "id": None}]
+
+    def test_dispatch_batch_mixed(self):
+        """Test valid and invalid items each get their own response"""
+        responses = self.server.dispatch([
+            {"jsonrpc": "2.0", "method": "test.add", "params": [1, 2], "id": 1},
+            {"jsonrpc": "2.0", "method": "test.echo", "params": ["x"], "id": [1]},
+            {"jsonrpc": "2.0", "method": "test.echo", "params": ["y"], "id": {"a": 1}},
+            {"foo": "boo"},
+            {"jsonrpc": "2.0", "method": "test.echo", "params": ["quiet"]},
+            {"jsonrpc": "2.0", "method": "test.add", "params": [2, 2], "id": 2},
+        ])
+        assert [(r["id"], r.get("result"), r.get("error", {}).get("code")) for r in responses] == [
+            (1, 3, None), (None, None, -32600), (None, None, -32600), (None, None, -32600), (2, 4, None)]
+        assert responses[1]["error"]["data"] == "id must be a string, number or null"
+
+    def test_dispatch_batch_of_notifications(self):
+        """Test a batch of only notifications produces nothing to send"""
+        assert self.server.dispatch([{"jsonrpc": "2.0", "method": "test.echo",
+                                      "params": {"message": "hi"}}]) is None
+
+    @pytest.mark.parametrize("batch", [
+        [],
+        [{"jsonrpc": "2.0", "method": "test.echo", "params": ["x"], "id": n} for n in range(4)],
+        [{"jsonrpc": "2.0", "method": "test.echo", "params": ["x"], "id": 7}] * 2,
+    ], ids=["empty", "too-large", "duplicate-ids"])
+    def test_dispatch_batch_rejected(self, batch):
+        """Test empty, oversized and ambiguous batches are rejected whole"""
+        server = JSONRPCServer(max_batch=3)
+        server.register_method("test.echo", self._echo_message)
+        response = server.dispatch(batch)
+        assert response["error"]["code"] == -32600
+        assert response["id"] is None
+
+    def test_dispatch_async_batch_concurrent(self):
+        """Test batch items run at the same time, with responses kept in order"""
+        import asyncio
+        import time
+        self.server.register_method("test.sleep", lambda n: time.sleep(0.2) or n)
+        batch = [{"jsonrpc": "2.0", "method": "test.sleep", "params": [n], "id": n}
+                 for n in range(4)]
+        batch.append({"jsonrpc": "2.0", "method": "test.sleep", "params": [9]})
+
+        start = time.monotonic()
+        responses = asyncio.run(self.server.dispatch_async(batch))
+        assert time.monotonic() - start < 0.6
+        assert [r["result"] for r in responses] == [0, 1, 2, 3]
+
+    def test_dispatch_async_matches_dispatch(self):
+        """Test the async path answers single and rejected requests the same way"""
+        import asyncio
+        single = {"jsonrpc": "2.0", "method": "test.add", "params": [1, 2], "id": 1}
+        assert asyncio.run(self.server.dispatch_async(single)) == self.server.dispatch(single)
+        assert asyncio.run(self.server.dispatch_async([])) == self.server.dispatch([])
+
     def test_create_jsonrpc_response(self):
         """Test creating JSON-RPC success response"""
         response = create_jsonrpc_response(42, 1)
@@ -157,6 +275,20 @@ class TestJSONRPCServer:
         assert response["error"]["data"]["method"] == "unknown"
         assert response["id"] == 1
 
+    def test_create_jsonrpc_error_shared_templates(self):
+        """Test common errors reuse one error object, others get their own"""
+        first = create_jsonrpc_error(-32600, "Invalid Request", 1)
+        second = create_jsonrpc_error(-32600, "Invalid Request", 2)
+        assert first["error"] is second["error"]
+        assert (first["id"], second["id"]) == (1, 2)
+
+        # data, or a custom message, means a fresh error object
+        with_data = create_jsonrpc_error(-32600, "Invalid Request", 3, "why")
+        assert with_data["error"] == {"code": -32600, "message": "Invalid Request", "data": "why"}
+        assert "data" not in first["error"]
+        custom = create_jsonrpc_error(-32600, "Bad batch", 4)
+        assert custom["error"] is not first["error"]
+
     def test_create_jsonrpc_error_without_data(self):
         """Test creating JSON-RPC error response without data"""
         response = create_jsonrpc_error(-32601, "Method not found", 1)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+
+import pexpect
+import pytest
+
+from mcp_server import MCPServer
+
+
+class TestIsolatedCommands:
+    """Test CMD: lines run in their own shell process"""
+
+    def test_cancel_kills_child(self, app, tmp_path):
+        """Test cancelling a running command kills and reaps its process"""
+        pid_file = tmp_path / "pid"
+        future = asyncio.run_coroutine_threadsafe(
+            app.mcp._run_isolated_command(f"echo $$ > {pid_file}; exec sleep 30"),
+            app.mcp._loop)
+
+        deadline = time.monotonic() + 5
+        while not pid_file.exists() or not pid_file.read_text().strip():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        pid = int(pid_file.read_text())
+
+        future.cancel()
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            assert time.monotonic() < deadline, "child outlived the cancelled command"
+            time.sleep(0.01)
+
+    def test_output_returned(self, app):
+        """Test a finished command's output comes back trimmed"""
+        future = asyncio.run_coroutine_threadsafe(
+            app.mcp._run_isolated_command("echo hello"), app.mcp._loop)
+        assert future.result(timeout=10) == "hello"
+
+
+class TestShellSetup:
+    """Test the prompt marker is in place before the first command"""
+
+    @pytest.fixture
+    def server(self):
+        """An MCP server on a bash session of its own"""
+        shell = pexpect.spawn('/bin/bash', encoding='utf-8', echo=False)
+        server = MCPServer(shell)
+        yield server
+        server.close()
+        shell.close(force=True)
+
+    def test_first_command_counts_like_later_ones(self, server):
+        """Test the first command's line count includes no marker setup output"""
+        def lines_output():
+            text = server.call_tool("write_to_terminal", {"command": "echo hi"})["content"][0]["text"]
+            return int(text.split()[0])
+
+        assert lines_output() == lines_output()
+
+
+class TestDirectoryResources:
+    """Test the files listed as resources for a directory"""
+
+    def test_symlinked_file_listed(self, tmp_path):
+        """Test a symlink to a file is listed like a file, and a subdirectory is not"""
+        (tmp_path / "real.txt").write_text("x")
+        (tmp_path / "link.txt").symlink_to(tmp_path / "real.txt")
+        (tmp_path / "sub").mkdir()
+        server = MCPServer(None)
+        try:
+            names = {r["name"] for r in server._list_directory_resources(str(tmp_path))[1:]}
+        finally:
+            server.close()
+        assert names == {"File: real.txt", "File: link.txt"}
+
+
+class TestRunTimeout:
+    """Test a command that outlives COMMAND_TIMEOUT does not hold the shell"""
+
+    def test_timed_out_command_cancelled(self, monkeypatch):
+        """Test the timed-out coroutine is cancelled and releases the shell lock"""
+        import concurrent.futures
+        monkeypatch.setattr("mcp_server.COMMAND_TIMEOUT", 0.1)
+        server = MCPServer(None)
+        cancelled = []
+
+        async def stuck():
+            async with server._get_shell_lock():
+                try:
+                    await asyncio.sleep(30)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+
+        async def locked():
+            async with server._get_shell_lock():
+                return "ran"
+
+        try:
+            with pytest.raises(concurrent.futures.TimeoutError):
+                server._run(stuck())
+            assert server._run(locked()) == "ran"
+            assert cancelled == [True]
+        finally:
+            server.close()
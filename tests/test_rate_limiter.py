@@ -0,0 +1,257 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from tools.rate_limiter import SWEEP_INTERVAL, RateLimiter, SecurityMiddleware, SlidingWindowLimiter
+
+
+@pytest.fixture
+def middleware():
+    return SecurityMiddleware()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for the limiters"""
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr("tools.rate_limiter.time.monotonic", lambda: Clock.now)
+    return Clock
+
+
+class TestRateLimiter:
+    """Test the token bucket"""
+
+    def test_burst_then_refill(self, clock):
+        """Test a key gets its capacity at once, then rate tokens per second"""
+        limiter = RateLimiter(rate=2.0, capacity=3)
+        assert [limiter.consume("a") for _ in range(4)] == [True, True, True, False]
+        assert limiter.consume("b")
+
+        clock.now += 1
+        assert limiter.get_remaining_tokens("a") == 2
+        assert [limiter.consume("a") for _ in range(3)] == [True, True, False]
+
+        clock.now += 60
+        assert limiter.get_remaining_tokens("a") == 3
+
+    def test_concurrent_consumers(self, clock):
+        """Test racing threads on one key never get more than its capacity"""
+        limiter = RateLimiter(rate=0.0, capacity=50)
+        admitted = []
+        def worker():
+            admitted.extend(limiter.consume("a") for _ in range(25))
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert admitted.count(True) == 50
+
+    def test_full_buckets_swept(self, clock):
+        """Test buckets back at capacity are dropped once a sweep is due"""
+        limiter = RateLimiter(rate=1.0, capacity=100)
+        assert limiter.consume("idle")
+        assert limiter.consume("busy", tokens=100)
+
+        clock.now += SWEEP_INTERVAL + 1
+        assert limiter.consume("new")
+        assert set(limiter.buckets) == {"busy", "new"}
+        assert limiter.get_remaining_tokens("busy") == SWEEP_INTERVAL + 1
+
+    def test_wall_clock_step_ignored(self, clock, monkeypatch):
+        """Test setting the wall clock back does not stall refills"""
+        limiter = RateLimiter(rate=1.0, capacity=1)
+        assert limiter.consume("a")
+        monkeypatch.setattr("tools.rate_limiter.time.time", lambda: 0.0)
+        clock.now += 1
+        assert limiter.consume("a")
+
+
+class TestSlidingWindowLimiter:
+    """Test the sliding window"""
+
+    def test_window(self, clock):
+        """Test requests are counted over the last window_size seconds only"""
+        limiter = SlidingWindowLimiter(window_size=60, max_requests=2)
+        assert [limiter.is_allowed("a") for _ in range(3)] == [True, True, False]
+        assert limiter.is_allowed("b")
+
+        clock.now += 61
+        assert limiter.get_request_count("a") == 0
+        assert limiter.is_allowed("a")
+
+    def test_expired_keys_swept(self, clock):
+        """Test keys with nothing left in the window are dropped once a sweep is due"""
+        limiter = SlidingWindowLimiter(window_size=10, max_requests=2)
+        assert limiter.is_allowed("old")
+        assert limiter.get_request_count("ghost") == 0
+
+        clock.now += SWEEP_INTERVAL + 1
+        assert limiter.is_allowed("new")
+        assert set(limiter.requests) == {"new"}
+
+    def test_partial_expiry(self, clock):
+        """Test a full window admits again as each of its oldest requests expires"""
+        limiter = SlidingWindowLimiter(window_size=10, max_requests=3)
+        for step in (0, 4, 4):
+            clock.now += step
+            assert limiter.is_allowed("a")
+        assert not limiter.is_allowed("a")
+
+        clock.now += 3  # only the first request has left the window
+        assert limiter.get_request_count("a") == 2
+        assert limiter.is_allowed("a")
+        assert not limiter.is_allowed("a")
+        assert limiter.get_request_count("a") == 3
+
+
+class TestRequestTime:
+    """Test the middleware's limiters share one clock read per request"""
+
+    def test_read_once(self, middleware, clock):
+        """Test a request is admitted at the time its first check read"""
+        with Flask(__name__).test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+            assert middleware.request_time() == 1000.0
+            clock.now += 5
+            assert middleware.request_time() == 1000.0
+            assert middleware.check_rate_limits() == (True, None)
+            assert middleware.api_limiter.buckets["10.0.0.1"].last_update == 1000.0
+
+
+class TestRequestSize:
+    """Test the request and JSON payload size limits"""
+
+    @pytest.mark.parametrize("size, result", [
+        (512 * 1024, (True, None)),
+        (512 * 1024 + 1, (False, "JSON payload too large")),
+    ])
+    def test_json_limit(self, middleware, monkeypatch, size, result):
+        """Test the JSON limit applies to the raw body, which is never parsed"""
+        def no_parse(*args, **kwargs):
+            raise AssertionError("body parsed")
+
+        monkeypatch.setattr("flask.Request.get_json", no_parse)
+        body = b'{"message": "' + b"a" * (size - 15) + b'"}'
+        assert len(body) == size
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", data=body, content_type="application/json"):
+            assert middleware.check_request_size() == result
+
+
+class TestSuspiciousContent:
+    """Test the suspicious-pattern checks on path, query and JSON body"""
+
+    @pytest.mark.parametrize("kwargs, reason", [
+        ({"path": "/files/../etc/passwd"}, "Suspicious URL pattern detected"),
+        ({"path": "/search", "query_string": {"q": "1 UNION all SELECT x"}},
+         "Suspicious query parameter detected"),
+        ({"path": "/chat", "json": {"message": "<SCRIPT>alert(1)</script>"}},
+         "Suspicious payload content detected"),
+        ({"path": "/chat", "json": {"code": "Eval(input())"}}, "Suspicious payload content detected"),
+    ])
+    def test_flagged(self, middleware, kwargs, reason):
+        """Test each pattern is matched case-insensitively where it appears"""
+        with Flask(__name__).test_request_context(method="POST", **kwargs):
+            assert middleware.check_suspicious_content() == (False, reason)
+
+    @pytest.mark.parametrize("body", [
+        b'{"message": "\\u003cscript>alert(1)"}',
+        b'{"message": "UNION \\n SELECT"}',
+        '{"message": "union \u017felect"}'.encode(),
+        b'{\n  "a": "union",\n  "b": "select"\n}',
+    ], ids=["escaped", "escaped-newline", "case-fold", "multi-line"])
+    def test_flagged_raw_body(self, middleware, body):
+        """Test payloads only their parsed form shows as suspicious are still caught"""
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", data=body, content_type="application/json"):
+            assert middleware.check_suspicious_content() == (False, "Suspicious payload content detected")
+
+    def test_body_not_parsed_when_plain(self, middleware, monkeypatch):
+        """Test a plain ASCII body is searched as bytes, without a JSON parse"""
+        def no_parse(*args, **kwargs):
+            raise AssertionError("body parsed")
+
+        monkeypatch.setattr("flask.Request.get_json", no_parse)
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", json={"message": "ls -la"}):
+            assert middleware.check_suspicious_content() == (True, None)
+
+    @pytest.mark.parametrize("message", ["union " * 40000, "union\u00e9 " * 40000])
+    def test_many_unions_linear(self, middleware, message):
+        """Test a body full of "union" is scanned once, on both the bytes and text paths"""
+        import time
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", json={"message": message}):
+            start = time.monotonic()
+            assert middleware.check_suspicious_content() == (True, None)
+            assert time.monotonic() - start < 1
+
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", json={"message": message + "select"}):
+            assert middleware.check_suspicious_content() == (False, "Suspicious payload content detected")
+
+    def test_clean_request(self, middleware):
+        """Test ordinary requests pass"""
+        with Flask(__name__).test_request_context(
+                "/chat", method="POST", query_string={"q": "select a union"},
+                json={"message": "list files in ./src"}):
+            assert middleware.check_suspicious_content() == (True, None)
+
+
+class TestBlockedIps:
+    """Test blocking single addresses and CIDR ranges"""
+
+    def test_block_and_unblock(self, middleware):
+        """Test addresses and ranges block exactly what they cover"""
+        with Flask(__name__).test_request_context():
+            middleware.block_ip("192.0.2.7")
+            middleware.block_ip("10.1.0.0/16")
+            middleware.block_ip("2001:db8::/32")
+
+            assert middleware.is_blocked("192.0.2.7")
+            assert not middleware.is_blocked("192.0.2.8")
+            assert middleware.is_blocked("10.1.200.3")
+            assert not middleware.is_blocked("10.2.0.1")
+            assert middleware.is_blocked("2001:db8::1")
+            assert not middleware.is_blocked("unknown")
+
+            middleware.unblock_ip("10.1.0.0/16")
+            assert not middleware.is_blocked("10.1.200.3")
+            middleware.unblock_ip("192.0.2.7")
+            assert not middleware.is_blocked("192.0.2.7")
+
+    def test_blocked_request_rejected(self, middleware):
+        """Test a client inside a blocked range is refused before rate limiting"""
+        with Flask(__name__).test_request_context(environ_base={"REMOTE_ADDR": "203.0.113.9"}):
+            middleware.block_ip("203.0.113.0/24")
+            assert middleware.check_rate_limits() == (False, "IP address blocked")
+
+
+class TestClientIp:
+    """Test which address a request is attributed to"""
+
+    @pytest.mark.parametrize("headers, ip", [
+        ({"X-Forwarded-For": "198.51.100.4, 10.0.0.1"}, "198.51.100.4"),
+        ({"X-Real-IP": "198.51.100.5"}, "198.51.100.5"),
+        ({"X-Forwarded-For": "", "X-Real-IP": "198.51.100.6"}, "198.51.100.6"),
+        ({}, "192.0.2.1"),
+    ])
+    def test_header_precedence(self, middleware, headers, ip):
+        """Test X-Forwarded-For, then X-Real-IP, then the peer address"""
+        with Flask(__name__).test_request_context(
+                headers=headers, environ_base={"REMOTE_ADDR": "192.0.2.1"}):
+            assert middleware.get_client_ip() == ip
+
+    def test_resolved_once(self, middleware, monkeypatch):
+        """Test repeat calls within a request reuse the first answer"""
+        calls = []
+        resolve = middleware._resolve_client_ip
+        monkeypatch.setattr(middleware, "_resolve_client_ip", lambda: calls.append(1) or resolve())
+        with Flask(__name__).test_request_context():
+            middleware.get_client_ip()
+            middleware.get_client_ip()
+        with Flask(__name__).test_request_context():
+            middleware.get_client_ip()
+        assert len(calls) == 2
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+
+import pytest
+
+from tools import sse_manager as sse
+from tools.sse_manager import SSEManager, create_sse_response
+
+
+def _stream(manager, client_id):
+    """The frame generator of a client's SSE response"""
+    return iter(create_sse_response(client_id, manager).response)
+
+
+class TestSSEManager:
+    """Test events are pushed to each client's stream as they are sent"""
+
+    def test_event_wakes_stream(self):
+        """Test a waiting stream yields an event as soon as it is sent"""
+        manager = SSEManager()
+        manager.add_client("c1")
+        frames = _stream(manager, "c1")
+        assert next(frames) == b'event: connected\ndata: {"client_id":"c1"}\n\n'
+
+        threading.Timer(0.05, manager.send_event, args=("c1", "output", {"text": "hi"})).start()
+        start = time.monotonic()
+        assert next(frames) == b'event: output\ndata: {"text":"hi"}\n\n'
+        assert time.monotonic() - start < 1
+
+    def test_broadcast_by_session(self):
+        """Test a broadcast reaches its session's clients only, without deadlocking"""
+        manager = SSEManager()
+        manager.add_client("a", session_id="s1")
+        manager.add_client("b", session_id="s2")
+
+        done = threading.Thread(target=manager.broadcast_event, args=("note", {"n": 1}, "s1"))
+        done.start()
+        done.join(timeout=2)
+        assert not done.is_alive()
+        assert manager.clients["a"].queue.get_nowait()["data"] == {"n": 1}
+        assert manager.clients["b"].queue.empty()
+
+    def test_broadcast_not_blocked_by_lock(self):
+        """Test a broadcast does not wait for the lock adds and removes take"""
+        manager = SSEManager()
+        manager.add_client("a")
+        with manager._lock:
+            manager.broadcast_event("note", {"n": 2})
+        assert manager.clients["a"].queue.get_nowait()["data"] == {"n": 2}
+
+    def test_active_clients(self):
+        """Test the lock-free client list follows adds and removes"""
+        manager = SSEManager()
+        manager.add_client("a")
+        manager.add_client("b")
+        snapshot = manager._snapshot
+        manager.remove_client("a")
+        assert manager.get_active_clients() == ["b"]
+        # the old view is never mutated under a reader
+        assert [client.client_id for client in snapshot] == ["a", "b"]
+        assert not snapshot[0].active
+
+    def test_ping_when_idle(self, monkeypatch):
+        """Test an idle stream gets a ping once the interval passes"""
+        monkeypatch.setattr(sse, "PING_INTERVAL", 0.05)
+        manager = SSEManager()
+        manager.add_client("c1")
+        frames = _stream(manager, "c1")
+        next(frames)
+        ping = next(frames)
+        assert ping.startswith(b'event: ping\ndata: {"timestamp":')
+        assert abs(json.loads(ping.split(b"data: ")[1])["timestamp"] - time.time()) < 5
+
+    def test_non_str_keys(self):
+        """Test payloads with non-str keys encode as json.dumps did"""
+        manager = SSEManager()
+        manager.add_client("c1")
+        frames = _stream(manager, "c1")
+        next(frames)
+        manager.send_event("c1", "counts", {1: "one"})
+        assert next(frames) == b'event: counts\ndata: {"1":"one"}\n\n'
+
+    def test_disconnect_removes_client(self):
+        """Test closing the stream drops the client"""
+        manager = SSEManager()
+        manager.add_client("c1")
+        frames = _stream(manager, "c1")
+        next(frames)
+        frames.close()
+        assert "c1" not in manager.clients
+        manager.send_event("c1", "late", {})
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from stdio_server import ResponseWriter
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "stdio_server.py")
+
+
+@pytest.fixture
+def stdio():
+    """Run stdio_server.py; returns a function that feeds it and collects responses"""
+    procs = []
+
+    def run(*writes, pause=0.1):
+        proc = subprocess.Popen([sys.executable, SERVER], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        procs.append(proc)
+        for data in writes:
+            proc.stdin.write(data)
+            proc.stdin.flush()
+            time.sleep(pause)
+        out, _ = proc.communicate(timeout=30)
+        return [json.loads(line) for line in out.splitlines()]
+
+    yield run
+    for proc in procs:
+        if proc.poll() is None:
+            proc.kill()
+
+
+def _frame(method, id=None, **extra):
+    message = {"jsonrpc": "2.0", "method": method, **extra}
+    if id is not None:
+        message["id"] = id
+    return json.dumps(message).encode()
+
+
+class TestStdioServer:
+    """Test the newline-framed JSON-RPC stdio transport"""
+
+    def test_batch_in_one_write(self, stdio):
+        """Test several frames in one write each get a response"""
+        data = b"\n".join([_frame("tools/list", 1), _frame("prompts/list", 2),
+                           _frame("no/such", 3)]) + b"\n"
+        responses = {r["id"]: r for r in stdio(data)}
+
+        assert set(responses) == {1, 2, 3}
+        assert "tools" in responses[1]["result"]
+        assert "prompts" in responses[2]["result"]
+        assert responses[3]["error"]["code"] == -32601
+
+    def test_frame_split_across_writes(self, stdio):
+        """Test a frame arriving in pieces, with blank lines and no final newline"""
+        frame = _frame("tools/list", 7)
+        responses = stdio(frame[:10], frame[10:] + b"\n\n  \n", _frame("prompts/list", 8))
+        assert sorted(r["id"] for r in responses) == [7, 8]
+
+    def test_parse_error(self, stdio):
+        """Test malformed JSON gets a parse error and later frames still run"""
+        responses = stdio(b"{not json\n" + _frame("tools/list", 1) + b"\n")
+        errors = [r for r in responses if "error" in r]
+        assert len(errors) == 1
+        assert errors[0]["error"]["code"] == -32700
+        assert errors[0]["id"] is None
+        assert [r["id"] for r in responses if "result" in r] == [1]
+
+    def test_notification_not_answered(self, stdio):
+        """Test a request without an id produces no output"""
+        responses = stdio(_frame("tools/list") + b"\n" + _frame("prompts/list", 5) + b"\n")
+        assert [r["id"] for r in responses] == [5]
+
+    def test_invalid_request_without_id_answered(self, stdio):
+        """Test an invalid request lacking an id gets an error, alone or in a batch"""
+        error = {"jsonrpc": "2.0", "id": None,
+                 "error": {"code": -32600, "message": "Invalid Request"}}
+        responses = stdio(b'{"foo": "boo"}\n[{"foo": "boo"}]\n')
+        # responses may go out in either order
+        assert sorted(responses, key=lambda r: isinstance(r, list)) == [error, [error]]
+
+    def test_batch_array(self, stdio):
+        """Test a JSON-RPC batch array is answered with one array"""
+        batch = b"[" + b",".join([_frame("tools/list", 1), _frame("tools/list"),
+                                  _frame("prompts/list", 2)]) + b"]\n"
+        responses = stdio(batch + _frame("tools/list") + b"\n")
+        assert len(responses) == 1
+        assert [r["id"] for r in responses[0]] == [1, 2]
+
+
+class RecordingStream:
+    """Stands in for stdout, recording each write and flush"""
+
+    def __init__(self):
+        self.writes = []
+        self.flushes = 0
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestResponseWriter:
+    """Test responses are batched per loop iteration"""
+
+    def test_one_write_per_iteration(self):
+        """Test responses queued together go out as one write and one flush"""
+        stream = RecordingStream()
+
+        async def respond():
+            writer = ResponseWriter(stream)
+            writer.write({"id": 1})
+            writer.write_line(b'{"id":2}\n')
+            writer.write({"id": 3})
+            await asyncio.sleep(0)
+            writer.write({"id": 4})
+            await asyncio.sleep(0)
+
+        asyncio.run(respond())
+        assert stream.writes == [b'{"id":1}\n{"id":2}\n{"id":3}\n', b'{"id":4}\n']
+        assert stream.flushes == 2
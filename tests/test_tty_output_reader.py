@@ -0,0 +1,64 @@
+import pytest
+
+from tools.tty_output_reader import TtyOutputReader
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    """The buffer is class-level state: start and end each test empty"""
+    TtyOutputReader.clear_buffer()
+    yield
+    TtyOutputReader.clear_buffer()
+
+
+def _feed(*chunks):
+    for chunk in chunks:
+        TtyOutputReader._append(chunk)
+    return TtyOutputReader.get_buffer()
+
+
+class TestAppend:
+    """Test incremental sanitizing of terminal output"""
+
+    def test_strips_sequences_and_cr(self):
+        """Test colour codes and carriage returns are removed"""
+        assert _feed("\x1b[1;32muser\x1b[0m:~$ ls\r\nfile\r\n") == "user:~$ ls\nfile\n"
+        assert TtyOutputReader.get_buffer_newline_count() == 2
+
+    @pytest.mark.parametrize("cut", range(1, 8))
+    def test_sequence_split_across_reads(self, cut):
+        """Test a sequence cut anywhere is removed once its final byte arrives"""
+        raw = "a\x1b[31mb"
+        assert _feed(raw[:cut], raw[cut:]) == "ab"
+
+    def test_split_sequence_held_back(self):
+        """Test an unfinished sequence stays out of the buffer until it completes"""
+        assert _feed("ready\x1b[") == "ready"
+        assert _feed("?25") == "ready"
+        assert _feed("h$ ") == "ready$ "
+
+    def test_lone_escape_not_held(self):
+        """Test an escape that cannot start a CSI sequence is passed through"""
+        assert _feed("a\x1bx") == "a\x1bx"
+        assert TtyOutputReader._pending == ""
+
+    def test_buffer_not_rescanned(self):
+        """Test text already in the buffer is never sanitized again"""
+        _feed("\x1b\x1b[0m")
+        # only the trailing, complete sequence is stripped; the first escape
+        # is not retroactively joined with later output
+        assert _feed("[a") == "\x1b[a"
+
+    def test_newline_count(self):
+        """Test the newline count follows what was appended"""
+        _feed("one\n\x1b[3", "1mtwo\r\n", "three")
+        assert TtyOutputReader.get_buffer() == "one\ntwo\nthree"
+        assert TtyOutputReader.get_buffer_newline_count() == 2
+        assert TtyOutputReader.read_tail(2) == "two\nthree"
+
+    def test_clear_buffer(self):
+        """Test clearing also drops a held-back partial sequence"""
+        _feed("x\x1b[3")
+        TtyOutputReader.clear_buffer()
+        assert _feed("1m") == "1m"
+        assert TtyOutputReader.get_buffer_newline_count() == 0
@@ -1,14 +1,24 @@
 # auth.py
+import heapq
 import time
 import secrets
+import threading
 import typing as t
 from typing import Optional, Dict, Any
 from functools import wraps
 from flask import request, current_app, jsonify, abort, g
 import jwt  # PyJWT
+import orjson
+from tools.json_provider import json_bytes_response
 
 # In-memory storage for tokens and clients
 TOKENS = {}
+# (expires_at, token) for every issued token, soonest first; lets
+# generate_token evict expired tokens without scanning TOKENS
+_EXPIRY_HEAP: list = []
+_EXPIRY_LOCK = threading.Lock()
+# Most live access tokens kept; past this, issuing one drops the oldest
+MAX_TOKENS = 100_000
 CLIENTS = {
     "mcp_client": {
         "client_secret": "mcp_secret",
@@ -16,11 +26,43 @@ CLIENTS = {
     }
 }
 
+# bodies of the 401s rejected requests get, serialized once
+_MISSING_BEARER_BODY = orjson.dumps({"error": "missing_bearer_token"})
+_TOKEN_EXPIRED_BODY = orjson.dumps({"error": "token_expired"})
+_INVALID_JWT_BODY = orjson.dumps({"error": "invalid_token"})
+_INVALID_REQUEST_BODY = orjson.dumps({
+    "error": "invalid_request",
+    "error_description": "Missing or invalid Authorization header"
+})
+_INVALID_TOKEN_BODY = orjson.dumps({
+    "error": "invalid_token",
+    "error_description": "Invalid or expired token"
+})
+
+# every token create() issues carries these; tokens missing any are rejected
+# outright (in particular, one without "exp" would never expire)
+_DECODE_OPTIONS = {"require": ["exp", "iat", "iss", "aud", "sub"]}
+
+# verified tokens remembered per JWTAuth (oldest dropped first)
+VERIFIED_CACHE_SIZE = 4096
+
 class JWTAuth:
     def __init__(self, secret: str, issuer: str = "term-mcp", audience: str = "term-mcp-clients"):
-        self.secret = secret
         self.issuer = issuer
         self.audience = audience
+        # token -> (exp, claims) for tokens whose signature already checked out
+        self._verified: Dict[str, tuple] = {}
+        self._verified_lock = threading.Lock()
+        self.set_secret(secret)
+
+    def set_secret(self, secret: str) -> None:
+        """
+        Switch the signing key in place, so every importer of auth sees it;
+        tokens verified under the old key are forgotten.
+        """
+        with self._verified_lock:
+            self.secret = secret
+            self._verified.clear()
 
     def create(self, sub: str, ttl_seconds: int = 3600) -> str:
         now = int(time.time())
@@ -34,9 +76,43 @@ class JWTAuth:
         return jwt.encode(payload, self.secret, algorithm="HS256")
 
     def verify(self, token: str) -> dict:
-        return jwt.decode(token, self.secret, algorithms=["HS256"], audience=self.audience, issuer=self.issuer)
-
-auth = JWTAuth(secret="CHANGE_ME")  # override via Config in app factory if desired
+        return self._decode(token, self.secret)
+
+    def _decode(self, token: str, secret: str) -> dict:
+        # PyJWT rejects a header alg other than HS256 before computing any
+        # HMAC, so no separate unverified-header check is needed
+        return jwt.decode(token, secret, algorithms=["HS256"], audience=self.audience,
+                          issuer=self.issuer, options=_DECODE_OPTIONS)
+
+    def verify_cached(self, token: str) -> dict:
+        """
+        verify() for repeat bearer tokens. A token is immutable, so once its
+        signature, issuer and audience have checked out only its expiry can
+        change: later calls with the same token skip the HMAC and decoding.
+        Returns a copy of the claims.
+        """
+        cached = self._verified.get(token)
+        if cached is not None:
+            exp, claims = cached
+            if exp > time.time():
+                return dict(claims)
+            # expired: drop it and let PyJWT raise ExpiredSignatureError
+            with self._verified_lock:
+                self._verified.pop(token, None)
+
+        secret = self.secret
+        claims = self._decode(token, secret)
+        exp = claims.get("exp")
+        if isinstance(exp, int):
+            with self._verified_lock:
+                # key changed while decoding: don't cache under the new one
+                if secret == self.secret:
+                    if len(self._verified) >= VERIFIED_CACHE_SIZE:
+                        self._verified.pop(next(iter(self._verified)))
+                    self._verified[token] = (exp, claims)
+        return dict(claims)
+
+auth = JWTAuth(secret="CHANGE_ME")  # secret set from Config by the app factory
 
 def _extract_bearer() -> str | None:
     hdr = request.headers.get("Authorization", "")
@@ -52,14 +128,14 @@ def require_token(optional: bool = False):
             if not token:
                 if optional:
                     return fn(*args, **kwargs)
-                return jsonify(error="missing_bearer_token"), 401
+                return json_bytes_response(_MISSING_BEARER_BODY, 401)
             try:
-                claims = auth.verify(token)
+                claims = auth.verify_cached(token)
                 request.jwt_claims = claims  # attach for handlers
             except jwt.ExpiredSignatureError:
-                return jsonify(error="token_expired"), 401
+                return json_bytes_response(_TOKEN_EXPIRED_BODY, 401)
             except Exception:
-                return jsonify(error="invalid_token"), 401
+                return json_bytes_response(_INVALID_JWT_BODY, 401)
             return fn(*args, **kwargs)
         return wrapper
     return decorator
@@ -70,23 +146,38 @@ def generate_token(client_id: str, scopes: list = None) -> str:
         scopes = ["read", "write"]
 
     token = secrets.token_urlsafe(32)
-    expires_at = time.time() + 3600  # 1 hour
+    now = time.time()
+    expires_at = now + 3600  # 1 hour
 
     TOKENS[token] = {
         "client_id": client_id,
         "scopes": scopes,
         "expires_at": expires_at,
-        "issued_at": time.time()
+        "issued_at": now
     }
 
+    # every new token pays for evicting the ones that have expired, and
+    # for keeping TOKENS bounded
+    with _EXPIRY_LOCK:
+        heapq.heappush(_EXPIRY_HEAP, (expires_at, token))
+        _evict_expired(now)
+        while len(TOKENS) > MAX_TOKENS:
+            # all tokens live an hour, so the soonest to expire is the oldest
+            TOKENS.pop(heapq.heappop(_EXPIRY_HEAP)[1], None)
+
     return token
 
+def _evict_expired(now: float):
+    """Drop expired tokens from TOKENS; caller holds _EXPIRY_LOCK"""
+    while _EXPIRY_HEAP and _EXPIRY_HEAP[0][0] <= now:
+        # revoked tokens are already gone from TOKENS
+        TOKENS.pop(heapq.heappop(_EXPIRY_HEAP)[1], None)
+
 def validate_token(token: str) -> Optional[Dict[str, Any]]:
-    """Validate an access token"""
-    if token in TOKENS:
-        token_data = TOKENS[token]
-        if token_data['expires_at'] > time.time():
-            return token_data
+    """Validate an access token; missing and expired tokens both give None"""
+    token_data = TOKENS.get(token)
+    if token_data is not None and token_data['expires_at'] > time.time():
+        return token_data
     return None
 
 def require_auth(f):
@@ -96,21 +187,16 @@ def require_auth(f):
         auth_header = request.headers.get('Authorization', '')
 
         if not auth_header.startswith('Bearer '):
-            return jsonify({
-                "error": "invalid_request",
-                "error_description": "Missing or invalid Authorization header"
-            }), 401
+            return json_bytes_response(_INVALID_REQUEST_BODY, 401)
 
         token = auth_header[7:]  # Remove 'Bearer ' prefix
         token_data = validate_token(token)
 
         if not token_data:
-            return jsonify({
-                "error": "invalid_token",
-                "error_description": "Invalid or expired token"
-            }), 401
+            return json_bytes_response(_INVALID_TOKEN_BODY, 401)
 
-        # Store token data in Flask g object for use in the route
+        # Store the token and its data in Flask g object for use in the route
+        g.bearer_token = token
         g.token_data = token_data
         return f(*args, **kwargs)
 
@@ -155,11 +241,8 @@ def init_oauth_app(app):
     @require_auth
     def revoke_token():
         """Revoke an access token"""
-        auth_header = request.headers.get('Authorization', '')
-        token = auth_header[7:]  # Remove 'Bearer ' prefix
-
-        if token in TOKENS:
-            del TOKENS[token]
+        # already parsed and validated by require_auth
+        if TOKENS.pop(g.bearer_token, None) is not None:
             return jsonify({"message": "Token revoked successfully"})
         else:
             return jsonify({"error": "Token not found"}), 404
@@ -1,8 +1,35 @@
 import time
 import asyncio
+import secrets
+import weakref
 from tools.tty_output_reader import TtyOutputReader
-from tools.process_tracker import ProcessTracker
-from tools.utils import sleep
+
+# Seconds without output after which a command that has not brought the
+# prompt back (an interactive program, a long silent job) counts as idle
+QUIET_PERIOD = 0.4
+
+# Safety cutoff for one command, in seconds
+COMMAND_CUTOFF = 20
+
+# Seconds to wait for the shell to confirm the prompt marker is installed;
+# this also covers a slow shell startup (heavy .bashrc), paid once per shell
+MARKER_SETUP_TIMEOUT = 10
+
+# shell -> the marker its prompt prints (see _prompt_marker)
+_prompt_markers = weakref.WeakKeyDictionary()
+
+async def _wait_readable(fd: int, timeout: float) -> bool:
+    """Wait until fd has data to read; False if timeout passes first"""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await asyncio.wait_for(ready, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
 
 class CommandExecutor:
     def __init__(self, shell):
@@ -16,45 +43,77 @@ class CommandExecutor:
         Execute the given 'command' in our shell session.
         1) Read leftover output first
         2) Send command
-        3) Wait until shell is 'idle' by checking CPU usage
-        4) Return entire buffer or new lines
+        3) Wait until the prompt is back, or the output has gone quiet
+        4) Return entire buffer
         """
+        marker = await self._prompt_marker()
+
         # read any leftover output first
         TtyOutputReader.read_shell_output(self.shell)
-        before_buffer = TtyOutputReader.get_buffer()
-        before_len = len(before_buffer.split("\n"))
 
         # send the command
         self.shell.sendline(command)
 
-        # short delay so output can start showing
-        await sleep(0.2)
+        # fast commands end as soon as their prompt arrives; programs that
+        # keep the terminal (or run silently) are left once output pauses
+        await self._wait_for_marker(marker, COMMAND_CUTOFF, QUIET_PERIOD)
 
-        # approximate 'processing' wait - watch CPU usage
-        tracker = ProcessTracker()
-        start_time = time.time()
-        while True:
-            # read any new shell output
-            TtyOutputReader.read_shell_output(self.shell)
+        # final read: the prompt text follows the marker
+        TtyOutputReader.read_shell_output(self.shell)
 
-            active_process = tracker.get_active_process()
-            # If no process or CPU usage < 1, assume idle
-            if not active_process or active_process["metrics"]["totalCPUPercent"] < 1:
-                # wait a bit for final lines to appear
-                await sleep(0.2)
-                TtyOutputReader.read_shell_output(self.shell)
-                break
+        return TtyOutputReader.get_buffer()
 
-            if (time.time() - start_time) > 20:
-                # safety cutoff after 20s
-                break
+    async def setup(self) -> None:
+        """
+        Install the prompt marker and read away its setup output, so that
+        output counted from here on is only the commands'. Run it before
+        the first command's lines are counted (MCPServer does, at startup).
+        """
+        await self._prompt_marker()
+        TtyOutputReader.read_shell_output(self.shell)
 
-            await sleep(0.3)
+    async def _prompt_marker(self) -> str:
+        """
+        Have bash print an invisible marker before every prompt, so the end
+        of a command is seen the moment it happens. The marker is a private
+        CSI sequence: the output sanitizer strips it like any colour code.
+        Installed once per shell, via PROMPT_COMMAND (keeping any existing).
+        """
+        marker = _prompt_markers.get(self.shell)
+        if marker is None:
+            nonce = secrets.randbelow(10 ** 12)
+            marker = f"\x1b[1337;{nonce}z"
+            self.shell.sendline(
+                f"PROMPT_COMMAND='printf \"\\033[1337;%sz\" {nonce}'"
+                '"${PROMPT_COMMAND:+;$PROMPT_COMMAND}"')
+            await self._wait_for_marker(marker, MARKER_SETUP_TIMEOUT)
+            _prompt_markers[self.shell] = marker
+        return marker
 
-        # final read
-        TtyOutputReader.read_shell_output(self.shell)
-        after_buffer = TtyOutputReader.get_buffer()
-        after_len = len(after_buffer.split("\n"))
-        lines_output = after_len - before_len
+    async def _wait_for_marker(self, marker: str, cutoff: float, quiet: float = None) -> bool:
+        """
+        Read shell output as it arrives until ``marker`` shows up (True),
+        ``cutoff`` seconds pass, or, if ``quiet`` is given, no output
+        arrives for that long (False).
+        """
+        fd = self.shell.child_fd
+        deadline = time.monotonic() + cutoff
+        # a marker may be split across reads
+        tail = ""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            wait = remaining if quiet is None else min(quiet, remaining)
+            if not await _wait_readable(fd, wait):
+                if quiet is not None:
+                    return False
+                continue
 
-        return after_buffer
+            raw = TtyOutputReader.read_shell_output(self.shell, timeout=0)
+            if not raw and not self.shell.isalive():
+                return False
+            seen = tail + raw
+            if marker in seen:
+                return True
+            tail = seen[-(len(marker) - 1):]
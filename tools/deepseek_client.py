@@ -1,19 +1,50 @@
 # -*- coding: utf-8 -*-
-import os, json, requests
+import os, requests
+import orjson
 from typing import Iterable, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 DEEPSEEK_BASE = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 DEEPSEEK_KEY  = os.getenv("DEEPSEEK_API_KEY")  # set in .env, DO NOT hardcode
 
 class DeepseekError(RuntimeError): ...
 
+def _make_session() -> requests.Session:
+    """
+    Keep-alive session so chat turns reuse pooled TLS connections.
+    Retry only covers connection failures; POSTs are not replayed once sent.
+    Up to 32 idle connections are kept; extra concurrent turns still connect
+    and their sockets are dropped afterwards (pool_block is off). httpx
+    with HTTP/2 would multiplex turns over one connection, but it needs
+    httpx and h2 as new dependencies for a win that only shows with many
+    simultaneous chats.
+    """
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.1),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+session = _make_session()
+
+# the key comes from the environment once, so the headers never change.
+# They are passed per call rather than set on session.headers: requests
+# merges session and call headers on every request either way, and
+# _headers() still has to raise when the key is missing.
+_HEADERS = {
+    "Authorization": f"Bearer {DEEPSEEK_KEY}",
+    "Content-Type": "application/json",
+}
+
 def _headers():
     if not DEEPSEEK_KEY:
         raise DeepseekError("missing DEEPSEEK_API_KEY")
-    return {
-        "Authorization": f"Bearer {DEEPSEEK_KEY}",
-        "Content-Type": "application/json",
-    }
+    return _HEADERS
 
 def chat(messages, model="deepseek-chat", temperature=0.7, timeout=30) -> str:
     """
@@ -26,7 +57,7 @@ def chat(messages, model="deepseek-chat", temperature=0.7, timeout=30) -> str:
         "temperature": temperature,
         "stream": False
     }
-    r = requests.post(url, headers=_headers(), json=payload, timeout=timeout)
+    r = session.post(url, headers=_headers(), json=payload, timeout=timeout)
     if r.status_code == 401:
         raise DeepseekError("401 unauthorized: invalid/expired key, wrong project, or unpaid account")
     if r.status_code == 404:
@@ -35,15 +66,18 @@ def chat(messages, model="deepseek-chat", temperature=0.7, timeout=30) -> str:
         raise DeepseekError("429 rate limit or insufficient credits")
     if r.status_code >= 400:
         raise DeepseekError(f"{r.status_code} {r.text}")
-    data = r.json()
+    data = orjson.loads(r.content)
     try:
         return data["choices"][0]["message"]["content"]
     except Exception:
-        raise DeepseekError(f"unexpected response: {json.dumps(data)[:500]}")
+        raise DeepseekError(f"unexpected response: {orjson.dumps(data)[:500].decode(errors='replace')}")
 
 def stream(messages, model="deepseek-chat", temperature=0.7, timeout=30) -> Iterable[str]:
     """
     Streaming chat completion. Yields text deltas.
+    Deliberately blocking: the app is WSGI (gunicorn gthread), where the
+    chat request already occupies its worker thread until the reply is
+    done, so an async client would free no threads without an ASGI server.
     """
     url = f"{DEEPSEEK_BASE.rstrip('/')}/v1/chat/completions"
     payload = {
@@ -52,20 +86,50 @@ def stream(messages, model="deepseek-chat", temperature=0.7, timeout=30) -> Iter
         "temperature": temperature,
         "stream": True
     }
-    with requests.post(url, headers=_headers(), json=payload, timeout=timeout, stream=True) as r:
+    with session.post(url, headers=_headers(), json=payload, timeout=timeout, stream=True) as r:
         if r.status_code == 401:
             raise DeepseekError("401 unauthorized")
         if r.status_code >= 400:
             raise DeepseekError(f"{r.status_code} {r.text}")
-        for line in r.iter_lines(decode_unicode=True):
-            if not line or not line.startswith("data:"):
-                continue
-            chunk = line[5:].strip()
-            if chunk == "[DONE]":
-                break
-            try:
-                obj = json.loads(chunk)
-                yield obj["choices"][0]["delta"].get("content", "")
-            except Exception:
-                # ignore malformed keepalives
-                continue
\ No newline at end of file
+        yield from iter_deltas(r)
+
+# Read size for streamed replies. SSE responses are chunked, and urllib3
+# hands each HTTP chunk over as soon as it arrives (split only above this
+# size), so a large size adds no latency while long answers take far fewer
+# reads and Python iterations than iter_lines' 512 bytes. A body without
+# chunked encoding would block until the whole size arrived, so it keeps
+# requests' small default.
+SSE_READ_SIZE = 65536
+
+def _iter_sse_lines(r) -> Iterable[bytes]:
+    """Split a streamed response body into lines, as bytes"""
+    size = SSE_READ_SIZE if getattr(r.raw, "chunked", False) else requests.models.ITER_CHUNK_SIZE
+    buf = bytearray()
+    for data in r.iter_content(chunk_size=size):
+        buf += data
+        start = 0
+        while (end := buf.find(b"\n", start)) != -1:
+            yield bytes(buf[start:end])
+            start = end + 1
+        del buf[:start]
+    if buf:
+        yield bytes(buf)
+
+def iter_deltas(r) -> Iterable[str]:
+    """
+    Yield the non-empty text deltas of a streamed (SSE) completion response.
+    Lines stay bytes until the delta content is pulled out of them.
+    """
+    for line in _iter_sse_lines(r):
+        if not line.startswith(b"data:"):
+            continue
+        chunk = line[5:].strip()
+        if chunk == b"[DONE]":
+            break
+        try:
+            text = orjson.loads(chunk)["choices"][0]["delta"].get("content")
+        except Exception:
+            # ignore malformed keepalives
+            continue
+        if text:
+            yield text
@@ -3,14 +3,31 @@ Comprehensive Error Handling System
 Provides structured error handling, logging, and recovery mechanisms
 """
 
+import time
 import logging
-import traceback
-from typing import Dict, Any, Optional
-from flask import jsonify
+from typing import Dict, Any, Optional, Tuple
+import orjson
+from flask import Response, jsonify
+from tools.json_provider import json_bytes_response
 from tools.json_rpc import JSONRPCError
 
 logger = logging.getLogger("error_handler")
 
+# Bodies of the fixed HTTP errors (probe scans hit these hardest),
+# serialized once
+_HTTP_ERROR_BODIES = {
+    400: orjson.dumps({"error": "Bad Request", "message": "Invalid request format"}),
+    404: orjson.dumps({"error": "Not Found", "message": "Endpoint not found"}),
+    405: orjson.dumps({"error": "Method Not Allowed", "message": "HTTP method not supported"}),
+}
+_INTERNAL_ERROR_BODY = orjson.dumps({
+    "error": "Internal Server Error",
+    "message": "An unexpected error occurred"
+})
+
+# Retry delays for ErrorRecovery, doubling from half a second
+_BACKOFFS = (0.5, 1.0, 2.0, 4.0)
+
 class MCPError(Exception):
     """Base exception class for MCP errors"""
 
@@ -71,43 +88,25 @@ class ErrorHandler:
     """Centralized error handling"""
 
     @staticmethod
-    def handle_flask_error(error: Exception) -> tuple:
-        """Handle Flask application errors"""
-        logger.error(f"Flask error: {error}")
-        logger.error(traceback.format_exc())
+    def handle_flask_error(error: Exception) -> Tuple[Response, int]:
+        """Handle Flask application errors; returns (response, status code)"""
+        logger.error("Flask error: %s", error, exc_info=error)
 
         if isinstance(error, MCPError):
             return ErrorHandler._format_mcp_error(error)
 
         # Handle common Flask/Werkzeug errors
-        if hasattr(error, 'code'):
-            if error.code == 400:
-                return jsonify({
-                    "error": "Bad Request",
-                    "message": "Invalid request format"
-                }), 400
-            elif error.code == 404:
-                return jsonify({
-                    "error": "Not Found",
-                    "message": "Endpoint not found"
-                }), 404
-            elif error.code == 405:
-                return jsonify({
-                    "error": "Method Not Allowed",
-                    "message": "HTTP method not supported"
-                }), 405
+        code = getattr(error, 'code', None)
+        if code in _HTTP_ERROR_BODIES:
+            return json_bytes_response(_HTTP_ERROR_BODIES[code], code), code
 
         # Generic server error
-        return jsonify({
-            "error": "Internal Server Error",
-            "message": "An unexpected error occurred"
-        }), 500
+        return json_bytes_response(_INTERNAL_ERROR_BODY, 500), 500
 
     @staticmethod
     def handle_jsonrpc_error(error: Exception) -> Dict[str, Any]:
         """Handle JSON-RPC specific errors"""
-        logger.error(f"JSON-RPC error: {error}")
-        logger.error(traceback.format_exc())
+        logger.error("JSON-RPC error: %s", error, exc_info=error)
 
         if isinstance(error, MCPError):
             return ErrorHandler._format_jsonrpc_error(error)
@@ -126,15 +125,13 @@ class ErrorHandler:
     @staticmethod
     def handle_async_error(error: Exception, context: str = "") -> None:
         """Handle errors in async operations"""
-        logger.error(f"Async error in {context}: {error}")
-        logger.error(traceback.format_exc())
+        logger.error("Async error in %s: %s", context, error, exc_info=error)
 
     @staticmethod
     def handle_command_error(command: str, error: Exception) -> CommandExecutionError:
         """Handle command execution errors"""
-        logger.error(f"Command execution failed: {command}")
-        logger.error(f"Error details: {error}")
-        logger.error(traceback.format_exc())
+        logger.error("Command execution failed: %s", command)
+        logger.error("Error details: %s", error, exc_info=error)
 
         return CommandExecutionError(command, str(error))
 
@@ -152,7 +149,7 @@ class ErrorHandler:
         return AuthenticationError(message)
 
     @staticmethod
-    def _format_mcp_error(error: MCPError) -> tuple:
+    def _format_mcp_error(error: MCPError) -> Tuple[Response, int]:
         """Format MCP error for HTTP response"""
         response = {
             "error": error.__class__.__name__,
@@ -208,8 +205,8 @@ class ErrorRecovery:
                 last_error = e
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
                 if attempt < max_attempts - 1:
-                    import time
-                    time.sleep(0.5 * (2 ** attempt))  # Exponential backoff
+                    # Exponential backoff
+                    time.sleep(_BACKOFFS[attempt] if attempt < len(_BACKOFFS) else 0.5 * (2 ** attempt))
 
         logger.error(f"All {max_attempts} attempts failed")
         raise last_error
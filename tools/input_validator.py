@@ -5,9 +5,23 @@ Provides security validation for user inputs and command execution
 
 import re
 import os
+import string
 from typing import Optional, List, Dict, Any
-from config import Config
-config = Config()
+from config import get_config
+config = get_config()
+
+# str.translate table deleting every URL-safe session id character
+_SESSION_ID_STRIP = str.maketrans("", "", string.ascii_letters + string.digits + "_-")
+
+# Character whitelists, compiled once rather than looked up in re's cache
+# on every call
+_CMD_SAFE_RE = re.compile(r'^[a-zA-Z0-9\s\-_\./:\'\"]+$')
+_CMD_PERMISSIVE_RE = re.compile(r'^[a-zA-Z0-9\s\-_\./:\'\"\|\&\;\<\>\(\)\[\]\{\}\?\*\+\^\$\@\#\%\=\!]+$')
+_MSG_RE = re.compile(r'^[\w\s\.,!?\-_\'\"@#$%^&*()+=[\]{}|\\:;/<>~`]*$', re.UNICODE)
+_USER_ID_RE = re.compile(r'^[a-zA-Z0-9_.-]+$')
+
+# Characters a file path may not contain
+_PATH_FORBIDDEN = frozenset('<>|&;`$()')
 
 class InputValidator:
     """Comprehensive input validation and sanitization"""
@@ -58,6 +72,13 @@ class InputValidator:
         r'wget.*\|\s*sh',  # wget pipe sh
     ]
 
+    # Both lists folded into one alternation, so a command is checked in a
+    # single regex search instead of one scan per entry
+    _DANGEROUS_RE = re.compile("|".join(
+        [re.escape(dangerous) for dangerous in DANGEROUS_COMMANDS] +
+        [f"(?:{pattern})" for pattern in DANGEROUS_PATTERNS]
+    ))
+
     @staticmethod
     def sanitize_command(command: str) -> str:
         """Sanitize a shell command"""
@@ -77,9 +98,9 @@ class InputValidator:
 
         # Basic sanitization - remove suspicious characters
         # Allow: alphanumeric, spaces, common symbols (-_./:), quotes
-        if not re.match(r'^[a-zA-Z0-9\s\-_\./:\'\"]+$', command):
+        if not _CMD_SAFE_RE.match(command):
             # More permissive pattern for complex commands
-            if not re.match(r'^[a-zA-Z0-9\s\-_\./:\'\"\|\&\;\<\>\(\)\[\]\{\}\?\*\+\^\$\@\#\%\=\!]+$', command):
+            if not _CMD_PERMISSIVE_RE.match(command):
                 raise ValueError("Command contains invalid characters")
 
         return command
@@ -87,19 +108,7 @@ class InputValidator:
     @staticmethod
     def _is_dangerous_command(command: str) -> bool:
         """Check if command contains dangerous operations"""
-        command_lower = command.lower()
-
-        # Check exact dangerous commands
-        for dangerous in InputValidator.DANGEROUS_COMMANDS:
-            if dangerous in command_lower:
-                return True
-
-        # Check dangerous patterns
-        for pattern in InputValidator.DANGEROUS_PATTERNS:
-            if re.search(pattern, command_lower):
-                return True
-
-        return False
+        return InputValidator._DANGEROUS_RE.search(command.lower()) is not None
 
     @staticmethod
     def validate_json_input(data: Any) -> Dict[str, Any]:
@@ -129,8 +138,8 @@ class InputValidator:
         # Remove leading/trailing slashes
         file_path = file_path.strip('/')
 
-        # Check for suspicious characters
-        if any(char in file_path for char in ['<', '>', '|', '&', ';', '`', '$', '(', ')']):
+        # Check for suspicious characters: one pass over the path
+        if not _PATH_FORBIDDEN.isdisjoint(file_path):
             raise ValueError("File path contains invalid characters")
 
         return file_path
@@ -148,11 +157,10 @@ class InputValidator:
             raise ValueError("Message too long (max 10000 characters)")
 
         # Basic content validation - allow common characters
-        # This is permissive to allow various languages and symbols
-        if not re.match(r'^[\w\s\.,!?\-_\'\"@#$%^&*()+=[\]{}|\\:;/<>~`]*$', message, re.UNICODE):
-            # Allow newlines and tabs
-            if not re.match(r'^[\w\s\.,!?\-_\'\"@#$%^&*()+=[\]{}|\\:;/<>~`\n\t\r]*$', message, re.UNICODE):
-                raise ValueError("Message contains invalid characters")
+        # This is permissive to allow various languages and symbols;
+        # \s already admits newlines and tabs
+        if not _MSG_RE.match(message):
+            raise ValueError("Message contains invalid characters")
 
         return message
 
@@ -166,8 +174,8 @@ class InputValidator:
         if len(session_id) < 10 or len(session_id) > 100:
             raise ValueError("Session ID length invalid")
 
-        # Allow URL-safe characters
-        if not re.match(r'^[a-zA-Z0-9_-]+$', session_id):
+        # Allow URL-safe characters: deleting them must leave nothing
+        if session_id.translate(_SESSION_ID_STRIP):
             raise ValueError("Session ID contains invalid characters")
 
         return session_id
@@ -184,7 +192,7 @@ class InputValidator:
             raise ValueError("User ID too long")
 
         # Allow alphanumeric, underscore, dash, dot
-        if not re.match(r'^[a-zA-Z0-9_.-]+$', user_id):
+        if not _USER_ID_RE.match(user_id):
             raise ValueError("User ID contains invalid characters")
 
         return user_id
@@ -230,7 +238,8 @@ class InputValidator:
 
         char = char.upper().strip()
 
-        if len(char) != 1 or not char.isalpha():
+        # ASCII range check: isalpha() would also admit letters like "É"
+        if len(char) != 1 or not "A" <= char <= "Z":
             raise ValueError("Control character must be a single letter (A-Z)")
 
         return char
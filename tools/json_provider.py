@@ -0,0 +1,53 @@
+# tools/json_provider.py
+import decimal
+import typing as t
+
+import orjson
+from flask import Flask, Response, current_app
+from flask.json.provider import JSONProvider
+
+_DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(o: t.Any) -> t.Any:
+    """Types Flask's default provider accepts that orjson does not."""
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson: jsonify(), dict return values and
+    request.get_json() all go through it. Output is always compact.
+    """
+
+    mimetype = "application/json"
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        return orjson.dumps(obj, default=_default, option=_DUMPS_OPTIONS).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        return orjson.loads(s)
+
+    def response(self, *args: t.Any, **kwargs: t.Any) -> Response:
+        # hand the bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=_DUMPS_OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def install_json_provider(app: Flask) -> Flask:
+    """Make orjson the app's JSON provider."""
+    app.json = OrjsonProvider(app)
+    return app
+
+
+def json_bytes_response(body: bytes, status: int = 200) -> Response:
+    """
+    A JSON response around a body serialized ahead of time, for the fixed
+    error bodies that dominate under probes and bad-token floods.
+    """
+    return current_app.response_class(body, status=status, mimetype=OrjsonProvider.mimetype)
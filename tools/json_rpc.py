@@ -1,7 +1,15 @@
-import json
 import uuid
-from typing import Dict, Any, Optional
-from flask import request, jsonify
+import asyncio
+import orjson
+from typing import Dict, Any, List, Optional, Union
+
+def _request():
+    """
+    Flask's request proxy, imported on first use: only the HTTP transport
+    needs Flask, so the stdio server never pays for importing it.
+    """
+    from flask import request
+    return request
 
 class JSONRPCError(Exception):
     def __init__(self, code: int, message: str, data: Any = None):
@@ -10,28 +18,122 @@ class JSONRPCError(Exception):
         self.data = data
         super().__init__(message)
 
+# Error objects for the protocol errors every transport hits (bad JSON,
+# bad envelopes, unknown methods), built once. They are shared between
+# responses, so they must not be mutated.
+_PARSE_ERR = {"code": -32700, "message": "Parse error"}
+_INVALID_REQUEST_ERR = {"code": -32600, "message": "Invalid Request"}
+_METHOD_NOT_FOUND_ERR = {"code": -32601, "message": "Method not found"}
+_COMMON_ERRORS = {
+    (err["code"], err["message"]): err
+    for err in (_PARSE_ERR, _INVALID_REQUEST_ERR, _METHOD_NOT_FOUND_ERR)
+}
+
+# Unknown methods are the most common error (probes, clients of newer MCP
+# revisions); the whole envelope is built once and only the id varies
+_METHOD_NOT_FOUND_ENV = {"jsonrpc": "2.0", "error": _METHOD_NOT_FOUND_ERR}
+
+# Largest batch array accepted in one request
+MAX_BATCH = 256
+
+# JSON values a request id may not be (ids are strings, numbers or null)
+_BAD_ID_TYPES = (list, dict)
+
 class JSONRPCServer:
-    def __init__(self):
+    def __init__(self, max_batch: int = MAX_BATCH):
         self.methods: Dict[str, callable] = {}
+        self.max_batch = max_batch
 
     def register_method(self, name: str, method: callable):
         """Register a method that can be called via JSON-RPC"""
         self.methods[name] = method
 
-    def handle_request(self) -> Dict[str, Any]:
+    def handle_request(self) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
         """
-        Handle a JSON-RPC request and return the response
+        Handle a JSON-RPC request and return the response (see dispatch)
         """
+        request = _request()
         try:
             if not request.is_json:
                 raise JSONRPCError(-32700, "Parse error")
+            body = request.get_data(cache=True)
+            # an object or array that does not close with } or ] is
+            # truncated: rejected without attempting a full parse. Other
+            # bodies go to the parser, as a well-formed scalar is an
+            # Invalid Request rather than a parse error
+            stripped = body.strip()
+            if stripped[:1] in (b"{", b"[") and not stripped.endswith((b"}", b"]")):
+                raise JSONRPCError(-32700, "Parse error")
+            # decoded straight from the bytes, whatever the app's JSON provider
+            rpc_request = orjson.loads(body)
+        except JSONRPCError as e:
+            return create_jsonrpc_error(e.code, e.message)
+        except ValueError:
+            return create_jsonrpc_error(-32700, "Parse error")
+
+        return self.dispatch(rpc_request)
 
-            rpc_request = request.get_json()
+    def dispatch(self, rpc_request: Any) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
+        """
+        Dispatch an already-parsed JSON-RPC request and return the response.
+        A batch (array) gets an array of responses, one per item that has an
+        id; a batch of only notifications returns None (nothing to send).
+        """
+        if not isinstance(rpc_request, list):
+            return self._dispatch_one(rpc_request)
 
+        error = self._check_batch(rpc_request)
+        if error is not None:
+            return error
+        return _batch_responses(rpc_request, [self._dispatch_one(item) for item in rpc_request])
+
+    async def dispatch_async(self, rpc_request: Any) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
+        """
+        Like dispatch, but called from an event loop: methods block (shell,
+        disk, DeepSeek), so each runs on a worker thread, and the items of a
+        batch run concurrently instead of one after another.
+        """
+        if not isinstance(rpc_request, list):
+            return await asyncio.to_thread(self._dispatch_one, rpc_request)
+
+        error = self._check_batch(rpc_request)
+        if error is not None:
+            return error
+        responses = await asyncio.gather(
+            *(asyncio.to_thread(self._dispatch_one, item) for item in rpc_request))
+        return _batch_responses(rpc_request, responses)
+
+    def _check_batch(self, batch: list) -> Optional[Dict[str, Any]]:
+        """Return the error for a batch that must be rejected whole, else None"""
+        if not batch or len(batch) > self.max_batch:
+            return create_jsonrpc_error(-32600, "Invalid Request",
+                                        data=f"batch must hold 1 to {self.max_batch} requests")
+
+        # responses are matched by id, so ids within a batch must be unique;
+        # an id that is not even a valid id (see _dispatch_one) is left to
+        # its own item's response
+        ids = [item["id"] for item in batch
+               if isinstance(item, dict) and "id" in item and not isinstance(item["id"], _BAD_ID_TYPES)]
+        if len(set(ids)) != len(ids):
+            return create_jsonrpc_error(-32600, "Invalid Request",
+                                        data="batch request ids must be unique")
+        return None
+
+    def _dispatch_one(self, rpc_request: Any) -> Dict[str, Any]:
+        """
+        Dispatch a single JSON-RPC request object and return its response
+        """
+        try:
             # Validate JSON-RPC 2.0 format
             if not isinstance(rpc_request, dict):
                 raise JSONRPCError(-32600, "Invalid Request")
 
+            request_id = rpc_request.get("id")
+            if isinstance(request_id, _BAD_ID_TYPES):
+                # ids are strings, numbers or null; this one cannot be echoed
+                request_id = None
+                raise JSONRPCError(-32600, "Invalid Request", data="id must be a string, number or null")
+
             jsonrpc_version = rpc_request.get("jsonrpc")
             if jsonrpc_version != "2.0":
                 raise JSONRPCError(-32600, "Invalid Request")
@@ -41,14 +143,13 @@ class JSONRPCServer:
                 raise JSONRPCError(-32600, "Invalid Request")
 
             params = rpc_request.get("params", {})
-            request_id = rpc_request.get("id")
 
-            # Check if method exists
-            if method_name not in self.methods:
-                raise JSONRPCError(-32601, "Method not found")
+            # One lookup both checks the method exists and fetches it
+            method = self.methods.get(method_name)
+            if method is None:
+                return _METHOD_NOT_FOUND_ENV | {"id": request_id}
 
             # Call the method
-            method = self.methods[method_name]
             if isinstance(params, dict):
                 result = method(**params)
             elif isinstance(params, list):
@@ -64,16 +165,8 @@ class JSONRPCServer:
             }
 
         except JSONRPCError as e:
-            response = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": e.code,
-                    "message": e.message
-                },
-                "id": request_id if 'request_id' in locals() else None
-            }
-            if e.data is not None:
-                response["error"]["data"] = e.data
+            response = create_jsonrpc_error(
+                e.code, e.message, request_id if 'request_id' in locals() else None, e.data)
 
         except Exception as e:
             response = {
@@ -88,6 +181,19 @@ class JSONRPCServer:
 
         return response
 
+def is_notification(message: Any) -> bool:
+    """
+    True for a valid request without an id, which never gets a response.
+    An invalid one is answered with its error, id null, even without an id.
+    """
+    return (isinstance(message, dict) and "id" not in message
+            and message.get("jsonrpc") == "2.0" and isinstance(message.get("method"), str))
+
+def _batch_responses(batch: list, responses: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """Drop the responses to notifications; None if nothing is left to send"""
+    kept = [response for item, response in zip(batch, responses) if not is_notification(item)]
+    return kept or None
+
 def create_jsonrpc_response(result: Any, request_id: Any = None) -> Dict[str, Any]:
     """Helper to create a JSON-RPC success response"""
     return {
@@ -98,6 +204,11 @@ def create_jsonrpc_response(result: Any, request_id: Any = None) -> Dict[str, An
 
 def create_jsonrpc_error(code: int, message: str, request_id: Any = None, data: Any = None) -> Dict[str, Any]:
     """Helper to create a JSON-RPC error response"""
+    if data is None:
+        error = _COMMON_ERRORS.get((code, message))
+        if error is not None:
+            return {"jsonrpc": "2.0", "error": error, "id": request_id}
+
     error = {
         "code": code,
         "message": message
@@ -3,14 +3,36 @@ Rate Limiting and Security Measures
 Provides protection against abuse and ensures fair usage
 """
 
+import re
 import time
+import bisect
+import ipaddress
 import threading
 from collections import defaultdict, deque
-from typing import Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 from flask import request, g
 from config import config
 
 
+# Number of per-key lock stripes (power of two): limiter checks for
+# different clients rarely wait on each other
+LOCK_STRIPES = 64
+
+# Seconds between sweeps for idle keys; a sweep walks every key once, so
+# one-off clients (scanners, bots) do not stay in memory for good
+SWEEP_INTERVAL = 60
+
+
+class _Bucket:
+    """Token bucket state for one key"""
+    __slots__ = ('tokens', 'last_update')
+
+    def __init__(self, tokens: float, last_update: float):
+        self.tokens = tokens
+        self.last_update = last_update
+
+
 class RateLimiter:
     """Token bucket rate limiter implementation"""
 
@@ -24,63 +46,93 @@ class RateLimiter:
         """
         self.rate = rate
         self.capacity = capacity
-        self.buckets: Dict[str, Dict] = {}
-        self._lock = threading.Lock()
-
-    def _get_bucket(self, key: str) -> Dict:
-        """Get or create bucket for key"""
-        if key not in self.buckets:
-            self.buckets[key] = {
-                'tokens': self.capacity,
-                'last_update': time.time()
-            }
-        return self.buckets[key]
-
-    def consume(self, key: str, tokens: int = 1) -> bool:
+        self.buckets: Dict[str, _Bucket] = {}
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._last_sweep = time.monotonic()
+
+    def _stripe(self, key: str) -> threading.Lock:
+        """Lock stripe guarding a key's bucket"""
+        return self._stripes[hash(key) & (LOCK_STRIPES - 1)]
+
+    def _get_bucket(self, key: str, now: float) -> _Bucket:
+        """Get or create bucket for key; caller holds the key's stripe"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _Bucket(self.capacity, now)
+        return bucket
+
+    def consume(self, key: str, tokens: int = 1, now: float = None) -> bool:
         """
         Try to consume tokens from bucket
 
         Args:
             key: Bucket identifier (e.g., IP address)
             tokens: Number of tokens to consume
+            now: A time.monotonic() value taken by the caller, if any
 
         Returns:
             True if tokens were consumed, False if rate limited
         """
-        with self._lock:
-            bucket = self._get_bucket(key)
-            now = time.time()
+        with self._stripe(key):
+            if now is None:
+                now = time.monotonic()
+            bucket = self._get_bucket(key, now)
 
             # Add tokens based on time elapsed
-            elapsed = now - bucket['last_update']
-            bucket['tokens'] = min(
+            elapsed = now - bucket.last_update
+            bucket.tokens = min(
                 self.capacity,
-                bucket['tokens'] + elapsed * self.rate
+                bucket.tokens + elapsed * self.rate
             )
-            bucket['last_update'] = now
+            bucket.last_update = now
 
             # Check if we have enough tokens
-            if bucket['tokens'] >= tokens:
-                bucket['tokens'] -= tokens
-                return True
+            allowed = bucket.tokens >= tokens
+            if allowed:
+                bucket.tokens -= tokens
 
-            return False
+        # outside the stripe: the sweep takes other keys' stripes
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+        return allowed
+
+    def _is_full(self, bucket: _Bucket, now: float) -> bool:
+        """True once a bucket has refilled to capacity"""
+        return bucket.tokens + (now - bucket.last_update) * self.rate >= self.capacity
+
+    def _sweep(self, now: float) -> int:
+        """
+        Drop every bucket that has refilled to capacity; returns how many
+        were removed. A full bucket behaves exactly like the fresh one its
+        key's next request creates, so no limit is loosened.
+        """
+        self._last_sweep = now
+        removed = 0
+        for key, bucket in list(self.buckets.items()):
+            if not self._is_full(bucket, now):
+                continue
+            with self._stripe(key):
+                # re-check: the key may have been used since the copy
+                if self.buckets.get(key) is bucket and self._is_full(bucket, now):
+                    del self.buckets[key]
+                    removed += 1
+        return removed
 
     def get_remaining_tokens(self, key: str) -> float:
         """Get remaining tokens for key"""
-        with self._lock:
-            bucket = self._get_bucket(key)
-            now = time.time()
+        with self._stripe(key):
+            now = time.monotonic()
+            bucket = self._get_bucket(key, now)
 
             # Update bucket
-            elapsed = now - bucket['last_update']
-            bucket['tokens'] = min(
+            elapsed = now - bucket.last_update
+            bucket.tokens = min(
                 self.capacity,
-                bucket['tokens'] + elapsed * self.rate
+                bucket.tokens + elapsed * self.rate
             )
-            bucket['last_update'] = now
+            bucket.last_update = now
 
-            return bucket['tokens']
+            return bucket.tokens
 
 
 class SlidingWindowLimiter:
@@ -96,37 +148,62 @@ class SlidingWindowLimiter:
         """
         self.window_size = window_size
         self.max_requests = max_requests
-        self.requests: Dict[str, deque] = defaultdict(deque)
-        self._lock = threading.Lock()
-
-    def is_allowed(self, key: str) -> bool:
-        """Check if request is allowed"""
-        with self._lock:
-            now = time.time()
+        # the last max_requests admitted times per key, oldest first
+        self.requests: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_requests))
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._last_sweep = time.monotonic()
+
+    def _stripe(self, key: str) -> threading.Lock:
+        """Lock stripe guarding a key's request times"""
+        return self._stripes[hash(key) & (LOCK_STRIPES - 1)]
+
+    def is_allowed(self, key: str, now: float = None) -> bool:
+        """Check if request is allowed; ``now`` is a caller's time.monotonic()"""
+        with self._stripe(key):
+            if now is None:
+                now = time.monotonic()
             request_queue = self.requests[key]
 
-            # Remove old requests outside the window
-            while request_queue and request_queue[0] < now - self.window_size:
-                request_queue.popleft()
-
-            # Check if under limit
-            if len(request_queue) < self.max_requests:
+            # Under the limit while fewer than max_requests were admitted,
+            # or the oldest of the last max_requests has left the window;
+            # appending then drops that oldest time, so nothing is pruned
+            allowed = len(request_queue) < self.max_requests or (
+                bool(request_queue) and request_queue[0] < now - self.window_size)
+            if allowed:
                 request_queue.append(now)
-                return True
 
-            return False
+        # outside the stripe: the sweep takes other keys' stripes
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+        return allowed
+
+    def _sweep(self, now: float) -> int:
+        """
+        Drop every key with no request left inside the window; returns how
+        many were removed. Such a key counts as never seen.
+        """
+        self._last_sweep = now
+        cutoff = now - self.window_size
+        removed = 0
+        for key, request_queue in list(self.requests.items()):
+            if request_queue and request_queue[-1] >= cutoff:
+                continue
+            with self._stripe(key):
+                # re-check: the key may have been used since the copy
+                if self.requests.get(key) is request_queue and (
+                        not request_queue or request_queue[-1] < cutoff):
+                    del self.requests[key]
+                    removed += 1
+        return removed
 
     def get_request_count(self, key: str) -> int:
         """Get current request count for key"""
-        with self._lock:
-            now = time.time()
+        with self._stripe(key):
+            now = time.monotonic()
             request_queue = self.requests[key]
 
-            # Clean old requests
-            while request_queue and request_queue[0] < now - self.window_size:
-                request_queue.popleft()
-
-            return len(request_queue)
+            # times are sorted: count those still inside the window
+            return len(request_queue) - bisect.bisect_left(request_queue, now - self.window_size)
 
 
 class SecurityMiddleware:
@@ -138,47 +215,78 @@ class SecurityMiddleware:
         self.auth_limiter = RateLimiter(rate=5.0, capacity=20)   # 5 req/sec for auth
         self.chat_limiter = SlidingWindowLimiter(window_size=60, max_requests=30)  # 30 req/min
 
-        # Blocked IPs
+        # Blocked IPs: exact addresses, plus CIDR ranges checked only when
+        # any are blocked
         self.blocked_ips: set = set()
+        self.blocked_networks: list = []
 
         # Suspicious patterns
         self.suspicious_patterns = [
             r'\.\./',  # Path traversal
             r'<script',  # XSS attempts
-            r'union.*select',  # SQL injection
             r'1=1',  # SQL injection
             r'eval\(',  # Code injection
             r'exec\(',  # Code injection
         ]
+        # SQL injection, "union.*select": searched as is, every "union" is
+        # a fresh start scanning to the end, quadratic on a body full of
+        # them. It is instead matched once per line (once per body for the
+        # raw bytes), committed to the line's first "union": a lookahead
+        # capture replayed by backreference is atomic, so nothing retries
+        union_select = r'(?=(.*?union))\1.*select'
+        # one case-insensitive search covers every pattern
+        union = "|".join(f"(?:{pattern})" for pattern in self.suspicious_patterns)
+        self.suspicious_re = re.compile(
+            rf'(?:^{union_select})|{union}', re.IGNORECASE | re.MULTILINE)
+        # the same search over a raw JSON body; DOTALL because the body may
+        # span lines where the parsed payload's repr never does
+        self.suspicious_bytes_re = re.compile(
+            rf'(?:\A{union_select})|{union}'.encode(), re.IGNORECASE | re.DOTALL)
 
     def get_client_ip(self) -> str:
-        """Get client IP address"""
+        """Get client IP address, resolved once per request"""
+        ip = g.get('_client_ip')
+        if ip is None:
+            ip = g._client_ip = self._resolve_client_ip()
+        return ip
+
+    def request_time(self) -> float:
+        """time.monotonic() at the first check of this request, taken once"""
+        now = g.get('now')
+        if now is None:
+            now = g.now = time.monotonic()
+        return now
+
+    def _resolve_client_ip(self) -> str:
         # Check for forwarded headers
-        if request.headers.get('X-Forwarded-For'):
-            return request.headers.get('X-Forwarded-For').split(',')[0].strip()
-        elif request.headers.get('X-Real-IP'):
-            return request.headers.get('X-Real-IP')
-        else:
-            return request.remote_addr or 'unknown'
+        headers = request.headers
+        forwarded_for = headers.get('X-Forwarded-For')
+        if forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+        real_ip = headers.get('X-Real-IP')
+        if real_ip:
+            return real_ip
+        return request.remote_addr or 'unknown'
 
     def check_rate_limits(self) -> Tuple[bool, Optional[str]]:
         """Check all rate limits"""
         client_ip = self.get_client_ip()
         endpoint = request.endpoint or 'unknown'
+        now = self.request_time()
 
         # Check if IP is blocked
-        if client_ip in self.blocked_ips:
+        if self.is_blocked(client_ip):
             return False, "IP address blocked"
 
         # Apply different limits based on endpoint
         if endpoint in ['chat', 'call_tool']:
-            if not self.chat_limiter.is_allowed(client_ip):
+            if not self.chat_limiter.is_allowed(client_ip, now=now):
                 return False, "Rate limit exceeded for chat operations"
         elif endpoint in ['oauth.token']:
-            if not self.auth_limiter.consume(client_ip):
+            if not self.auth_limiter.consume(client_ip, now=now):
                 return False, "Rate limit exceeded for authentication"
         else:
-            if not self.api_limiter.consume(client_ip):
+            if not self.api_limiter.consume(client_ip, now=now):
                 return False, "Rate limit exceeded for API calls"
 
         return True, None
@@ -195,9 +303,10 @@ class SecurityMiddleware:
             except ValueError:
                 pass
 
-        # Check JSON payload size
-        if request.is_json and request.get_json(silent=True):
-            json_size = len(str(request.get_json()).encode('utf-8'))
+        # Check JSON payload size: the raw body, which the content check
+        # reuses, measured without parsing it
+        if request.is_json:
+            json_size = len(request.get_data(cache=True))
             if json_size > 512 * 1024:  # 512KB limit
                 return False, "JSON payload too large"
 
@@ -205,25 +314,30 @@ class SecurityMiddleware:
 
     def check_suspicious_content(self) -> Tuple[bool, Optional[str]]:
         """Check for suspicious content patterns"""
-        import re
+        suspicious = self.suspicious_re.search
 
         # Check URL path
-        if any(re.search(pattern, request.path, re.IGNORECASE) for pattern in self.suspicious_patterns):
+        if suspicious(request.path):
             return False, "Suspicious URL pattern detected"
 
         # Check query parameters
         for key, value in request.args.items():
             if isinstance(value, str):
-                if any(re.search(pattern, value, re.IGNORECASE) for pattern in self.suspicious_patterns):
+                if suspicious(value):
                     return False, "Suspicious query parameter detected"
 
         # Check JSON payload
         if request.is_json:
-            json_data = request.get_json(silent=True)
-            if json_data:
-                json_str = str(json_data)
-                if any(re.search(pattern, json_str, re.IGNORECASE) for pattern in self.suspicious_patterns):
-                    return False, "Suspicious payload content detected"
+            raw = request.get_data(cache=True)
+            if raw.isascii() and b"\\" not in raw:
+                # no escapes and no non-ASCII case folding: the raw body
+                # holds exactly the text its parsed values would
+                flagged = self.suspicious_bytes_re.search(raw)
+            else:
+                json_data = request.get_json(silent=True)
+                flagged = json_data and suspicious(str(json_data))
+            if flagged:
+                return False, "Suspicious payload content detected"
 
         return True, None
 
@@ -254,33 +368,58 @@ class SecurityMiddleware:
         else:
             logger.info(f"Security event: {log_data}")
 
+    def is_blocked(self, ip: str) -> bool:
+        """Check an address against the blocked addresses and ranges"""
+        if ip in self.blocked_ips:
+            return True
+        if not self.blocked_networks:
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.blocked_networks)
+
     def block_ip(self, ip: str, reason: str = "Manual block"):
-        """Block an IP address"""
-        self.blocked_ips.add(ip)
+        """Block an IP address, or a CIDR range (e.g. 10.0.0.0/8)"""
+        if '/' in ip:
+            network = ipaddress.ip_network(ip, strict=False)
+            if network not in self.blocked_networks:
+                self.blocked_networks.append(network)
+        else:
+            self.blocked_ips.add(ip)
         self.log_security_event('ip_blocked', {
             'blocked_ip': ip,
             'reason': reason
         })
 
     def unblock_ip(self, ip: str):
-        """Unblock an IP address"""
-        self.blocked_ips.discard(ip)
+        """Unblock an IP address, or a CIDR range blocked as such"""
+        if '/' in ip:
+            network = ipaddress.ip_network(ip, strict=False)
+            if network in self.blocked_networks:
+                self.blocked_networks.remove(network)
+        else:
+            self.blocked_ips.discard(ip)
         self.log_security_event('ip_unblocked', {
             'unblocked_ip': ip
         })
 
-    def get_security_headers(self) -> Dict[str, str]:
-        """Get security headers for responses"""
-        return {
-            'X-Content-Type-Options': 'nosniff',
-            'X-Frame-Options': 'DENY',
-            'X-XSS-Protection': '1; mode=block',
-            'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
-            'Content-Security-Policy': "default-src 'self'",
-            'Referrer-Policy': 'strict-origin-when-cross-origin',
-            'Permissions-Policy': 'geolocation=(), microphone=(), camera=()'
-        }
-
+    def get_security_headers(self) -> Mapping[str, str]:
+        """Get security headers for responses (a shared, read-only mapping)"""
+        return _SECURITY_HEADERS
+
+
+# Static, so built once rather than per response
+_SECURITY_HEADERS: Mapping[str, str] = MappingProxyType({
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'Content-Security-Policy': "default-src 'self'",
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+    'Permissions-Policy': 'geolocation=(), microphone=(), camera=()'
+})
 
 # Global security middleware instance
 security_middleware = SecurityMiddleware()
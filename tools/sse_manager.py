@@ -3,84 +3,107 @@ Server-Sent Events Manager
 Handles real-time streaming of terminal output to clients
 """
 
-import json
 import time
+import queue
 import threading
-from typing import Dict, List, Callable, Any
+from functools import lru_cache
+from typing import Dict, List, Tuple, Callable, Any
+import orjson
 from flask import Response
+from config import config
+from models.event_bus import EventQueue
+
+# Seconds between keep-alive pings on an idle stream
+PING_INTERVAL = 30
+
+# ping frame: only the timestamp is formatted in
+_PING_FMT = b'event: ping\ndata: {"timestamp":%b}\n\n'
+
+@lru_cache(maxsize=64)
+def _event_prefix(event_type: str) -> bytes:
+    """The "event:" line plus the "data:" prefix of a frame, per event type"""
+    return b"event: " + event_type.encode("utf-8") + b"\ndata: "
+
+def _frame(event_type: str, data: Any) -> bytes:
+    """Encode one SSE frame; the blank line terminates it"""
+    # non-str keys are stringified, as json.dumps did
+    return _event_prefix(event_type) + orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+class _Client:
+    """One connected SSE client"""
+    __slots__ = ('client_id', 'session_id', 'connected_at', 'last_ping', 'active', 'queue')
+
+    def __init__(self, client_id: str, session_id: str = None):
+        now = time.time()
+        self.client_id = client_id
+        self.session_id = session_id
+        self.connected_at = now
+        self.last_ping = now
+        self.active = True
+        # bounded like the event bus: a stalled client loses its oldest
+        # events rather than growing without limit
+        self.queue = EventQueue(config.EVENT_QUEUE_SIZE)
 
 class SSEManager:
     """Manages Server-Sent Events for real-time communication"""
 
     def __init__(self):
-        self.clients: Dict[str, Dict[str, Any]] = {}
+        self.clients: Dict[str, _Client] = {}
+        # immutable view of the clients, replaced on every add/remove so
+        # readers iterate it without taking the lock
+        self._snapshot: Tuple[_Client, ...] = ()
         self._lock = threading.Lock()
 
     def add_client(self, client_id: str, session_id: str = None) -> str:
         """Add a new SSE client"""
         with self._lock:
-            client_data = {
-                "client_id": client_id,
-                "session_id": session_id,
-                "connected_at": time.time(),
-                "last_ping": time.time(),
-                "active": True
-            }
-            self.clients[client_id] = client_data
+            self.clients[client_id] = _Client(client_id, session_id)
+            self._snapshot = tuple(self.clients.values())
             return client_id
 
     def remove_client(self, client_id: str):
         """Remove an SSE client"""
         with self._lock:
-            if client_id in self.clients:
-                self.clients[client_id]["active"] = False
-                del self.clients[client_id]
+            client = self.clients.pop(client_id, None)
+            if client is not None:
+                client.active = False
+                self._snapshot = tuple(self.clients.values())
 
     def update_ping(self, client_id: str):
         """Update client's last ping time"""
-        with self._lock:
-            if client_id in self.clients:
-                self.clients[client_id]["last_ping"] = time.time()
+        client = self.clients.get(client_id)
+        if client is not None:
+            client.last_ping = time.time()
 
     def get_active_clients(self) -> List[str]:
         """Get list of active client IDs"""
-        with self._lock:
-            return [cid for cid, data in self.clients.items() if data["active"]]
+        return [client.client_id for client in self._snapshot if client.active]
 
     def send_event(self, client_id: str, event_type: str, data: Any):
         """Send an event to a specific client"""
-        with self._lock:
-            if client_id in self.clients and self.clients[client_id]["active"]:
-                client_data = self.clients[client_id]
-                # In a real implementation, this would queue the event
-                # For now, we'll just mark it for processing
-                client_data["pending_events"] = client_data.get("pending_events", [])
-                client_data["pending_events"].append({
-                    "type": event_type,
-                    "data": data,
-                    "timestamp": time.time()
-                })
+        # no lock: the dict read is atomic, and the queue wakes the
+        # client's stream itself
+        client = self.clients.get(client_id)
+        if client is not None and client.active:
+            client.queue.put({
+                "type": event_type,
+                "data": data,
+                "timestamp": time.time()
+            })
 
     def broadcast_event(self, event_type: str, data: Any, session_id: str = None):
         """Broadcast event to all clients or clients in a session"""
-        with self._lock:
-            for client_id, client_data in self.clients.items():
-                if client_data["active"]:
-                    if session_id is None or client_data.get("session_id") == session_id:
-                        self.send_event(client_id, event_type, data)
-
-    def get_pending_events(self, client_id: str) -> List[Dict[str, Any]]:
-        """Get pending events for a client"""
-        with self._lock:
-            if client_id in self.clients:
-                return self.clients[client_id].get("pending_events", [])
-            return []
-
-    def clear_pending_events(self, client_id: str):
-        """Clear pending events for a client"""
-        with self._lock:
-            if client_id in self.clients:
-                self.clients[client_id]["pending_events"] = []
+        # one walk over the snapshot, without the manager lock: each
+        # client's queue is safe to put to from any thread. Streams only
+        # read the event, so every client shares the one dict
+        event = {
+            "type": event_type,
+            "data": data,
+            "timestamp": time.time()
+        }
+        for client in self._snapshot:
+            if client.active and (session_id is None or client.session_id == session_id):
+                client.queue.put(event)
 
 def create_sse_response(client_id: str, sse_manager: SSEManager):
     """Create SSE response for a client"""
@@ -89,36 +112,35 @@ def create_sse_response(client_id: str, sse_manager: SSEManager):
         """Generator function for SSE stream"""
         try:
             # Send initial connection event
-            yield f"event: connected\ndata: {json.dumps({'client_id': client_id})}\n\n"
+            yield _frame("connected", {"client_id": client_id})
+
+            client = sse_manager.clients.get(client_id)
+            if client is None:
+                return
+            events = client.queue
 
+            next_ping = time.monotonic() + PING_INTERVAL
             while True:
-                # Check for pending events
-                events = sse_manager.get_pending_events(client_id)
-                if events:
-                    for event in events:
-                        event_type = event.get("type", "message")
-                        event_data = event.get("data", {})
-                        timestamp = event.get("timestamp", time.time())
-
-                        yield f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n"
-
-                    # Clear processed events
-                    sse_manager.clear_pending_events(client_id)
-
-                # Send ping every 30 seconds
-                current_time = time.time()
-                if current_time - sse_manager.clients.get(client_id, {}).get("last_ping", 0) > 30:
+                # block until an event arrives or the next ping is due
+                try:
+                    event = events.get(timeout=max(0.0, next_ping - time.monotonic()))
+                except queue.Empty:
+                    # Send ping every 30 seconds
+                    current_time = time.time()
                     sse_manager.update_ping(client_id)
-                    yield f"event: ping\ndata: {json.dumps({'timestamp': current_time})}\n\n"
+                    next_ping = time.monotonic() + PING_INTERVAL
+                    # a float's repr is its JSON form
+                    yield _PING_FMT % repr(current_time).encode("ascii")
+                    continue
 
-                time.sleep(0.1)  # Small delay to prevent busy waiting
+                yield _frame(event.get("type", "message"), event.get("data", {}))
 
         except GeneratorExit:
             # Client disconnected
             sse_manager.remove_client(client_id)
         except Exception as e:
             # Send error event
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            yield _frame("error", {"error": str(e)})
             sse_manager.remove_client(client_id)
 
     return Response(
@@ -3,6 +3,12 @@ import pexpect
 import re
 
 ANSI_ESCAPE_PATTERN = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+# An escape sequence cut off at the end of a chunk (its final byte has not
+# arrived yet)
+ANSI_ESCAPE_PREFIX = re.compile(r'\x1B(?:\[[0-?]*[ -/]*)?\Z')
+
+# Characters requested from the pty per read
+READ_CHUNK = 65536
 
 
 class TtyOutputReader:
@@ -12,29 +18,59 @@ class TtyOutputReader:
     """
 
     _buffer = ""
+    # "\n" count of _buffer, kept up to date as output is appended
+    _newlines = 0
+    # raw tail of the last read: the start of an unfinished escape sequence
+    _pending = ""
 
     @staticmethod
-    def read_shell_output(shell: pexpect.spawn):
+    def read_shell_output(shell: pexpect.spawn, timeout: float = 0.05) -> str:
+        """
+        Read until the shell has been quiet for ``timeout`` seconds, adding
+        the output to the buffer. Returns the raw text read (escape
+        sequences included), so callers can look for markers in it.
+        """
+        chunks = []
         try:
             while True:
-                chunk = shell.read_nonblocking(1024, timeout=0.05)
+                chunk = shell.read_nonblocking(READ_CHUNK, timeout=timeout)
                 if not chunk:
                     break
-                # Append chunk
-                TtyOutputReader._buffer += chunk
-                # Strip ANSI codes and carriage returns
-                TtyOutputReader._buffer = ANSI_ESCAPE_PATTERN.sub('', TtyOutputReader._buffer)
-                TtyOutputReader._buffer = TtyOutputReader._buffer.replace('\r', '')
+                TtyOutputReader._append(chunk)
+                chunks.append(chunk)
         except pexpect.TIMEOUT:
             pass
         except pexpect.EOF:
             pass
+        return "".join(chunks)
+
+    @staticmethod
+    def _append(chunk: str):
+        """
+        Strip ANSI codes and carriage returns from newly read output only,
+        then append it; the existing buffer is never rescanned. An escape
+        sequence split across reads is held back until it is complete.
+        """
+        data = TtyOutputReader._pending + chunk
+        esc = data.rfind('\x1b')
+        if esc >= 0 and ANSI_ESCAPE_PREFIX.match(data, esc):
+            data, TtyOutputReader._pending = data[:esc], data[esc:]
+        else:
+            TtyOutputReader._pending = ""
+        clean = ANSI_ESCAPE_PATTERN.sub('', data).replace('\r', '')
+        TtyOutputReader._buffer += clean
+        TtyOutputReader._newlines += clean.count("\n")
 
     @staticmethod
     def get_buffer() -> str:
         """Return the entire accumulated buffer so far."""
         return TtyOutputReader._buffer
 
+    @staticmethod
+    def get_buffer_newline_count() -> int:
+        """Return how many newlines the buffer holds, without touching it."""
+        return TtyOutputReader._newlines
+
     @staticmethod
     def read_tail(lines_of_output: int) -> str:
         """
@@ -48,6 +84,8 @@ class TtyOutputReader:
     def clear_buffer():
         """Clear everything if needed."""
         TtyOutputReader._buffer = ""
+        TtyOutputReader._newlines = 0
+        TtyOutputReader._pending = ""
 
     @staticmethod
     def call(lines_of_output: int) -> str:
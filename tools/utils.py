@@ -3,3 +3,15 @@ import asyncio
 async def sleep(seconds: float):
     """Async sleep helper."""
     await asyncio.sleep(seconds)
+
+def install_event_loop_policy() -> bool:
+    """
+    Use uvloop for every event loop created afterwards, if it is installed.
+    Returns True when uvloop was installed (not available on Windows).
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    uvloop.install()
+    return True
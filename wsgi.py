@@ -0,0 +1,12 @@
+# wsgi.py
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Each worker imports this module after forking, so every worker spawns its
+own shell and MCP event loop; nothing pexpect-backed crosses a fork.
+"""
+from server_new import create_app
+
+application = create_app()